@@ -2,12 +2,16 @@ from itertools import chain, groupby
 
 import bm_runtime.standard.ttypes as bm_types
 
+from p4t.simple.classifiers import ClassifierView
 from p4t.simple.vmr import SVMREntry, tobits
 
 from p4t.bmv2.vmr import BmvVMREntry, BmvVMRDefaultEntry, BmvVMRAction, tobytes, to_runtime_data
 from p4t.bmv2.utils import chain_tables
 from p4t.bmv2.primitives import PriorityEncoder, KeyConstruction, SubKey
 
+# Suffix of the names of the tables that dispatch between groups of a multigroup classifier
+DISPATCHER_SUFFIX = "_dispatch"
+
 
 class BmvBasicClassifier(object):
     """ VMR with attached table.
@@ -72,12 +76,15 @@ class BmvBasicClassifier(object):
             self._table.name, action.action.name, action.runtime_data
         )
 
-    def subset(self, name, i):
-        result = BmvActionClassifier(name, self.table)
-        result.default_action = self.default_action
-        for entry in self[i]:
-            result.add(entry)
-        return result
+    def subset(self, name, indices):
+        return ClassifierView(name, self, indices)
+
+    def _copy_subset(self, name, indices):
+        """ Copies entries at the given indices, the name is kept by the view only. """
+        return BmvBasicClassifier(
+            self._table,
+            chain((self._vmr[i] for i in indices), [self._default_entry] if self._default_entry is not None else [])
+        )
 
     @property
     def bmv_entries(self):
@@ -142,13 +149,14 @@ class BmvBasicClassifier(object):
         priority = None
 
         if not entry.isdefault():
-            for match_key, field in zip(entry.match_key, self._table.fields):
-                if match_key.type == bm_types.BmMatchParamType.LPM:
-                    key.extend(tobits(match_key.lpm.key, field.length))
-                    mask.extend([True] * match_key.lpm.prefix_length + [False] * (field.length - match_key.lpm.prefix_length))
+            for param_type, param, field in zip(entry.param_types, entry.params, self._table.fields):
+                if param_type == bm_types.BmMatchParamType.LPM:
+                    param_key, prefix_length = param
+                    key.extend(tobits(param_key, field.length))
+                    mask.extend([True] * prefix_length + [False] * (field.length - prefix_length))
                 else:
                     raise NotImplementedError
-            priority = entry.options.priority
+            priority = entry.priority
         else:
             length = sum(f.length for f in self._table.fields)
             key = [False] * length
@@ -223,7 +231,7 @@ class BmvMultigroupClassifier(object):
         self._prios = PriorityEncoder()
 
         self._dispatcher = self._create_dispatcher(
-            name + "_dispatch", self._pipeline, self._prios.prio
+            name + DISPATCHER_SUFFIX, self._pipeline, self._prios.prio
         )
 
         self._subclassifiers = []
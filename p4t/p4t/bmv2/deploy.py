@@ -0,0 +1,144 @@
+""" Bulk installation of BMV2 VMR entries over a pool of Thrift connections. """
+
+import threading
+import time
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+from p4t.bmv2.classifiers import DISPATCHER_SUFFIX
+
+
+class DeploymentReport(namedtuple('DeploymentReport', ['handles', 'num_entries', 'num_defaults', 'seconds'])):
+    """ The result of a deployment.
+
+    Attributes:
+        handles: For each entry, its handle, or None if it is a default entry.
+        num_entries: The number of installed (non-default) entries.
+        num_defaults: The number of default actions set.
+        seconds: Wall time of the deployment.
+    """
+
+    __slots__ = ()
+
+    @property
+    def throughput(self):
+        """ Installed entries per second. """
+        return (self.num_entries + self.num_defaults) / self.seconds if self.seconds > 0 else 0.0
+
+
+def is_dispatcher(table_name):
+    """ Returns whether the table is a dispatcher of a multigroup classifier. """
+    return table_name.endswith(DISPATCHER_SUFFIX)
+
+
+def deployment_stages(entries):
+    """ Splits entries into stages that are installed one after another.
+
+    Default actions come first and then entries of dispatcher tables, so that
+    a packet never reaches a group table before the tables leading to it are set.
+
+    Args:
+        entries: Sequence of BmvVMREntry and BmvVMRDefaultEntry.
+    Returns:
+        A list of lists of entry indices.
+    """
+    defaults, dispatchers, groups = [], [], []
+    for i, entry in enumerate(entries):
+        if entry.isdefault():
+            defaults.append(i)
+        elif is_dispatcher(entry.table_name):
+            dispatchers.append(i)
+        else:
+            groups.append(i)
+    return [stage for stage in (defaults, dispatchers, groups) if stage]
+
+
+def _batches(indices, batch_size):
+    return [indices[i:i + batch_size] for i in range(0, len(indices), batch_size)]
+
+
+class Deployer(object):
+    """ Installs entries in batches that are sent over several Thrift connections in parallel.
+
+    Thrift clients are not thread safe, so every thread of the pool opens its own
+    connection when it sends its first batch, all of them are closed at the end
+    of the deployment. Within a stage (see deployment_stages) entries are
+    installed in no particular order.
+    """
+
+    def __init__(self, connect, num_connections=4, batch_size=1024, progress=None, disconnect=None):
+        """ Initializes a deployer.
+
+        Args:
+            connect: Callable that opens a new standard Thrift client.
+            num_connections: The number of connections and threads.
+            batch_size: The number of entries sent by a thread at once.
+            progress: Optional callable, called with the number of installed entries,
+                their total number and the elapsed seconds after each batch.
+            disconnect: Optional callable that closes a client opened by connect.
+        """
+        self._connect = connect
+        self._disconnect = disconnect
+        self._num_connections = num_connections
+        self._batch_size = batch_size
+        self._progress = progress
+        self._local = threading.local()
+        self._clients = []
+        self._clients_lock = threading.Lock()
+
+    def deploy(self, entries):
+        """ Installs entries, returns DeploymentReport.
+
+        Raises the first error of opening a connection or of a Thrift call after
+        the batches that are already being sent are complete, the remaining
+        batches are not sent.
+        """
+        entries = list(entries)
+        handles = [None] * len(entries)
+        num_done = 0
+        start = time.time()
+
+        pool = ThreadPool(self._num_connections)
+        try:
+            for stage in deployment_stages(entries):
+                batches = ([entries[i] for i in batch] for batch in _batches(stage, self._batch_size))
+                for batch, batch_handles in zip(_batches(stage, self._batch_size), pool.imap(self._send, batches)):
+                    for i, handle in zip(batch, batch_handles):
+                        handles[i] = handle
+                    num_done += len(batch)
+                    if self._progress is not None:
+                        self._progress(num_done, len(entries), time.time() - start)
+        finally:
+            # Drops the batches that are not taken by threads yet, which is a no-op on success
+            pool.terminate()
+            pool.join()
+            self._close()
+
+        num_defaults = sum(1 for entry in entries if entry.isdefault())
+        return DeploymentReport(handles, len(entries) - num_defaults, num_defaults, time.time() - start)
+
+    def _open(self):
+        client = self._connect()
+        with self._clients_lock:
+            self._clients.append(client)
+        self._local.client = client
+        return client
+
+    def _close(self):
+        clients, self._clients = self._clients, []
+        if self._disconnect is not None:
+            for client in clients:
+                self._disconnect(client)
+
+    def _send(self, batch):
+        client = getattr(self._local, 'client', None) or self._open()
+        handles = []
+        for entry in batch:
+            if entry.isdefault():
+                client.bm_mt_set_default_action(0, entry.table_name, entry.action_name, entry.runtime_data)
+                handles.append(None)
+            else:
+                handles.append(client.bm_mt_add_entry(
+                    0, entry.table_name, entry.match_key, entry.action_name, entry.runtime_data, entry.options
+                ))
+        return handles
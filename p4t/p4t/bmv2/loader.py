@@ -0,0 +1,223 @@
+""" Streaming parser of runtime CLI command files (table_add and table_set_default lines). """
+
+import marshal
+from collections import deque, namedtuple
+from itertools import islice
+from multiprocessing import Pool
+
+import runtime_CLI as bm_CLI
+import bm_runtime.standard.ttypes as bm_types
+
+from p4t.bmv2.vmr import BmvCompactVMREntry, BmvVMRDefaultEntry
+
+_PARAM_TYPES = {
+    bm_CLI.MatchType.EXACT: bm_types.BmMatchParamType.EXACT,
+    bm_CLI.MatchType.LPM: bm_types.BmMatchParamType.LPM,
+    bm_CLI.MatchType.TERNARY: bm_types.BmMatchParamType.TERNARY,
+    bm_CLI.MatchType.VALID: bm_types.BmMatchParamType.VALID,
+    bm_CLI.MatchType.RANGE: bm_types.BmMatchParamType.RANGE,
+}
+
+# Parser of a worker process, set up by _init_worker
+_WORKER_PARSER = None
+
+
+class _TableInfo(namedtuple('_TableInfo', ['table', 'param_types', 'bitwidths', 'with_priority'])):
+    __slots__ = ()
+
+
+class _Parser(object):
+    """ Parses command lines into entries, keeps per table information between lines. """
+
+    def __init__(self, tables, actions):
+        self._tables = tables
+        self._actions = actions
+        self._table_infos = {}
+
+    def parse(self, line):
+        """ Returns the entry of a command line, None if the line is blank or a comment. """
+        args = line.split()
+        if not args or args[0].startswith('#'):
+            return None
+        if args[0] == 'table_add':
+            return self._parse_table_add(args[1:])
+        if args[0] == 'table_set_default':
+            return self._parse_table_set_default(args[1:])
+        raise ValueError("Unsupported command: {:s}".format(args[0]))
+
+    def _parse_table_add(self, args):
+        if len(args) < 3:
+            raise ValueError("table_add needs at least 3 arguments")
+        table_name, action_name = args[0], args[1]
+        info = self._table_info(table_name)
+        action = self._action(info.table, table_name, action_name)
+
+        priority = 0
+        if info.with_priority:
+            priority = int(args.pop(-1))
+
+        if '=>' in args:
+            idx = args.index('=>')
+            match_key, action_params = args[2:idx], args[idx + 1:]
+        else:
+            match_key, action_params = args[2:], []
+        if len(match_key) != len(info.param_types):
+            raise ValueError("Table {:s} needs {:d} key fields".format(table_name, len(info.param_types)))
+
+        params = tuple(
+            self._parse_param(param_type, field, bitwidth)
+            for param_type, field, bitwidth in zip(info.param_types, match_key, info.bitwidths)
+        )
+        return BmvCompactVMREntry(
+            table_name, info.param_types, params, action_name,
+            self._parse_runtime_data(action, action_params), priority
+        )
+
+    def _parse_table_set_default(self, args):
+        if len(args) < 2:
+            raise ValueError("table_set_default needs at least 2 arguments")
+        table_name, action_name = args[0], args[1]
+        action = self._action(self._table_info(table_name).table, table_name, action_name)
+        return BmvVMRDefaultEntry(table_name, action_name, self._parse_runtime_data(action, args[2:]))
+
+    @staticmethod
+    def _parse_param(param_type, field, bitwidth):
+        if param_type == bm_types.BmMatchParamType.EXACT:
+            return bm_CLI.parse_param(field, bitwidth)
+        elif param_type == bm_types.BmMatchParamType.LPM:
+            prefix, length = _split(field, '/')
+            return bm_CLI.parse_param(prefix, bitwidth), int(length)
+        elif param_type == bm_types.BmMatchParamType.TERNARY:
+            key, mask = _split(field, '&&&')
+            return bm_CLI.parse_param(key, bitwidth), bm_CLI.parse_param(mask, bitwidth)
+        elif param_type == bm_types.BmMatchParamType.VALID:
+            return bool(int(field))
+        else:
+            start, end = _split(field, '->')
+            return bm_CLI.parse_param(start, bitwidth), bm_CLI.parse_param(end, bitwidth)
+
+    def _table_info(self, table_name):
+        info = self._table_infos.get(table_name)
+        if info is None:
+            if table_name not in self._tables:
+                raise ValueError("Unknown table: {:s}".format(table_name))
+            table = self._tables[table_name]
+            info = self._table_infos[table_name] = _TableInfo(
+                table,
+                tuple(_PARAM_TYPES[match_type] for _, match_type, _ in table.key),
+                tuple(bitwidth for _, _, bitwidth in table.key),
+                table.match_type in {bm_CLI.MatchType.TERNARY, bm_CLI.MatchType.RANGE}
+            )
+        return info
+
+    def _action(self, table, table_name, action_name):
+        if action_name not in table.actions:
+            raise ValueError("Table {:s} has no action {:s}".format(table_name, action_name))
+        return self._actions[action_name]
+
+    @staticmethod
+    def _parse_runtime_data(action, params):
+        if len(params) != action.num_params():
+            raise ValueError("Action {:s} needs {:d} parameters".format(action.name, action.num_params()))
+        return bm_CLI.parse_runtime_data(action, params)
+
+
+def _split(field, separator):
+    parts = field.split(separator)
+    if len(parts) != 2:
+        raise ValueError("Invalid match value {:s}, use '{:s}' to separate its parts".format(field, separator))
+    return parts
+
+
+def _parse_chunk(parser, first_line, lines):
+    entries = []
+    for line_number, line in enumerate(lines, first_line):
+        try:
+            entry = parser.parse(line)
+        except (bm_CLI.UIn_Error, ValueError) as err:
+            raise ValueError("line {:d}: {:s}".format(line_number, str(err)))
+        if entry is not None:
+            entries.append(entry)
+    return entries
+
+
+def _init_worker(tables, actions):
+    global _WORKER_PARSER  # pylint: disable=global-statement
+    _WORKER_PARSER = _Parser(tables, actions)
+
+
+def _parse_chunk_in_worker(chunk):
+    # Entries are sent back marshalled as plain tuples, which is several times faster than pickling
+    entries = _parse_chunk(_WORKER_PARSER, *chunk)
+    return marshal.dumps([(entry.isdefault(), tuple(entry)) for entry in entries])
+
+
+def _unmarshal_entries(data):
+    return [
+        (BmvVMRDefaultEntry if isdefault else BmvCompactVMREntry)._make(fields)
+        for isdefault, fields in marshal.loads(data)
+    ]
+
+
+def _chunks(lines, chunk_size):
+    lines = iter(lines)
+    first_line = 1
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield first_line, chunk
+        first_line += len(chunk)
+
+
+def parse_commands(lines, tables, actions, num_workers=1, chunk_size=65536):
+    """ Lazily parses table_add and table_set_default commands into entries.
+
+    Match keys are kept as plain values (see BmvCompactVMREntry), blank lines and
+    lines starting with # are skipped.
+
+    Args:
+        lines: Iterable of command lines, e.g., a file.
+        tables: Dict mapping a table name to its runtime CLI description (bm_CLI.TABLES).
+        actions: Dict mapping an action name to its runtime CLI description (bm_CLI.ACTIONS).
+        num_workers: The number of processes that parse chunks of lines in parallel,
+            at most twice as many chunks are read ahead.
+        chunk_size: The number of lines in a chunk.
+
+    Yields:
+        BmvCompactVMREntry and BmvVMRDefaultEntry in the order of lines.
+
+    Raises:
+        ValueError: A line cannot be parsed, the message starts with its number.
+    """
+    if num_workers <= 1:
+        parser = _Parser(tables, actions)
+        for first_line, chunk in _chunks(lines, chunk_size):
+            for entry in _parse_chunk(parser, first_line, chunk):
+                yield entry
+        return
+
+    # Workers get the metadata once, so that it is not sent with every chunk. Chunks are
+    # submitted one by one as results are consumed (unlike Pool.imap, which reads all lines
+    # ahead), so only a bounded number of them is held in memory.
+    pool = Pool(num_workers, initializer=_init_worker, initargs=(tables, actions))
+    try:
+        pending = deque()
+        for chunk in _chunks(lines, chunk_size):
+            if len(pending) == 2 * num_workers:
+                for entry in _unmarshal_entries(pending.popleft().get()):
+                    yield entry
+            pending.append(pool.apply_async(_parse_chunk_in_worker, (chunk,)))
+        while pending:
+            for entry in _unmarshal_entries(pending.popleft().get()):
+                yield entry
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def load_commands(path, tables, actions, num_workers=1, chunk_size=65536):
+    """ Lazily parses a command file, see parse_commands. """
+    with open(path) as commands:
+        for entry in parse_commands(commands, tables, actions, num_workers, chunk_size):
+            yield entry
@@ -32,6 +32,45 @@ def _create_in_with_id(where, cls, *args):
     return result
 
 
+class _NameIndex(object):
+    """ Wrappers of named JSON entries, created once and looked up by name in O(1).
+
+    Entries appended to the JSON list by other means are indexed on the next access.
+    """
+
+    def __init__(self, entries, wrap, name=lambda json: json['name']):
+        self._entries = entries
+        self._wrap = wrap
+        self._name = name
+        self._positions = {}
+        self._wrappers = []
+
+    def get(self, name):
+        self._sync()
+        return self._wrapper(if_unique(name, self._positions.get(name, [])))
+
+    def add(self, wrapper):
+        """ Registers the wrapper of the entry that has just been appended. """
+        self._sync()
+        assert self._entries[-1] is wrapper._json  # pylint: disable=protected-access
+        self._wrappers[-1] = wrapper
+        return wrapper
+
+    def __iter__(self):
+        self._sync()
+        return (self._wrapper(i) for i in range(len(self._entries)))
+
+    def _sync(self):
+        for i in range(len(self._wrappers), len(self._entries)):
+            self._positions.setdefault(self._name(self._entries[i]), []).append(i)
+            self._wrappers.append(None)
+
+    def _wrapper(self, i):
+        if self._wrappers[i] is None:
+            self._wrappers[i] = self._wrap(self._entries[i])
+        return self._wrappers[i]
+
+
 def _create_in(where, cls, *args):
     result = cls._create_instance(*args)  # pylint: disable=protected-access
     where.append(result._json)  # pylint: disable=protected-access
@@ -39,33 +78,45 @@ def _create_in(where, cls, *args):
 
 
 class Program(object):
+    """ Wrapper of a bmv2 JSON config.
+
+    Pipelines, actions, headers and header types are indexed by name, and the
+    same wrapper is returned for an entry every time.
+    """
+
     def __init__(self, json):
         self._json = json
+        self._pipelines = _NameIndex(json['pipelines'], lambda x: Pipeline(self, x))
+        self._actions = _NameIndex(json['actions'], lambda x: Action(self, x))
+        self._headers = _NameIndex(json['headers'], lambda x: Header(self, x))
+        self._header_types = _NameIndex(json['header_types'], lambda x: HeaderType(self, x))
 
     def get_pipeline(self, name):
-        return Pipeline(self, json=find_unique_name(name, self._json['pipelines']))
+        return self._pipelines.get(name)
 
     def get_action(self, name):
-        return Action(self, json=find_unique_name(name, self._json['actions']))
+        return self._actions.get(name)
 
     def add_action(self, name, parameters):
-        return _create_in_with_id(self._json['actions'], Action, self, name, parameters)
+        return self._actions.add(_create_in_with_id(self._json['actions'], Action, self, name, parameters))
 
     def get_header(self, name):
-        return Header(self, json=find_unique_name(name, self._json['headers']))
+        return self._headers.get(name)
 
     def add_header(self, name, header_type, metadata):
-        return _create_in_with_id(self._json['headers'], Header, self, name, header_type, metadata)
+        return self._headers.add(
+            _create_in_with_id(self._json['headers'], Header, self, name, header_type, metadata)
+        )
 
     def get_header_type(self, name):
-        return HeaderType(self, json=find_unique_name(name, self._json['header_types']))
+        return self._header_types.get(name)
 
     def add_header_type(self, name):
-        return _create_in_with_id(self._json['header_types'], HeaderType, self, name)
+        return self._header_types.add(_create_in_with_id(self._json['header_types'], HeaderType, self, name))
 
     @property
     def pipelines(self):
-        return tuple(Pipeline(self, json) for json in self._json['pipelines'])
+        return tuple(self._pipelines)
 
 
 class Action(object):
@@ -148,6 +199,7 @@ class HeaderType(object):
     def __init__(self, program, json):
         self._program = program
         self._json = json
+        self._fields = _NameIndex(json['fields'], lambda x: Field(self, x), name=lambda x: x[0])
 
     @classmethod
     def _create_instance(cls, idx, program, name):
@@ -160,14 +212,14 @@ class HeaderType(object):
         })
 
     def add_field(self, name, length):
-        return _create_in(self._json['fields'], Field, self, name, length)
+        return self._fields.add(_create_in(self._json['fields'], Field, self, name, length))
 
     def get_field(self, name):
-        return Field(self, json=find_unique_name_idx(name, 0, self._json['fields']))
+        return self._fields.get(name)
 
     @property
     def fields(self):
-        return tuple(Field(self, json) for json in self._json['fields'])
+        return tuple(self._fields)
 
     @property
     def name(self):
@@ -200,6 +252,7 @@ class Header(object):
     def __init__(self, program, json):
         self._program = program
         self._json = json
+        self._field_instances = {}
 
     @classmethod
     def _create_instance(cls, idx, program, name, header_type, metadata): # pylint: disable=too-many-arguments
@@ -219,11 +272,13 @@ class Header(object):
         return self._json['name']
 
     def get_field_instance(self, field):
-        if isinstance(field, basestring):
-            return FieldInstance(self, self.header_type.get_field(field))
-        if field.header_type.name != self.header_type.name:
-            raise ValueError('field must belong to {:s}'.format(self.header_type.name))
-        return FieldInstance(self, field)
+        if not isinstance(field, basestring):
+            if field.header_type.name != self.header_type.name:
+                raise ValueError('field must belong to {:s}'.format(self.header_type.name))
+            field = field.name
+        if field not in self._field_instances:
+            self._field_instances[field] = FieldInstance(self, self.header_type.get_field(field))
+        return self._field_instances[field]
 
 class FieldInstance(object):
     def __init__(self, header, field):
@@ -249,25 +304,61 @@ class Pipeline(object):
     def __init__(self, p4, json):
         self._p4 = p4
         self._json = json
+        self._tables = _NameIndex(json['tables'], lambda x: Table(self, x))
+        self._conditionals = _NameIndex(json['conditionals'], lambda x: Conditional(self, x))
+        self._predecessors = None
 
     def add_table(self, name, match_type, max_size):
-        return _create_in_with_id(self._json['tables'], Table, self, name, match_type, max_size)
+        return self._tables.add(_create_in_with_id(self._json['tables'], Table, self, name, match_type, max_size))
 
     def get_table(self, name):
-        return Table(self, json=find_unique_name(name, self._json['tables']))
+        return self._tables.get(name)
 
     @property
     def tables(self):
-        return tuple(Table(self, json) for json in self._json['tables'])
+        return tuple(self._tables)
 
     @property
     def conditionals(self):
-        return tuple(Conditional(self, json) for json in self._json['conditionals'])
+        return tuple(self._conditionals)
 
     @property
     def program(self):
         return self._p4
 
+    def predecessors(self, table):
+        """ Edges of the control flow graph that lead to the table.
+
+        An edge is a pair of a table and an action name (None for the default next),
+        or of a conditional and whether it is the true branch.
+        """
+        return tuple(self._cfg().get(table.name, ()))
+
+    def _cfg(self):
+        """ Reverse edges of the control flow graph by the target table name, built on first use. """
+        # pylint: disable=protected-access
+        if self._predecessors is None:
+            self._predecessors = {}
+            for table in self._tables:
+                self._add_edge((table, None), table._json['base_default_next'])
+                for action_name, next_name in table._json['next_tables'].items():
+                    self._add_edge((table, action_name), next_name)
+            for conditional in self._conditionals:
+                self._add_edge((conditional, True), conditional._json['true_next'])
+                self._add_edge((conditional, False), conditional._json['false_next'])
+        return self._predecessors
+
+    def _add_edge(self, edge, target_name):
+        if target_name:
+            self._predecessors.setdefault(target_name, set()).add(edge)
+
+    def _move_edge(self, edge, old_name, new_name):
+        if self._predecessors is None:
+            return
+        if old_name:
+            self._predecessors[old_name].discard(edge)
+        self._add_edge(edge, new_name)
+
 class Conditional(object):
     def __init__(self, pipeline, json):
         self._pipeline = pipeline
@@ -280,6 +371,7 @@ class Conditional(object):
         return self._pipeline.get_table(false_next)
 
     def _set_false_next(self, table):
+        self._pipeline._move_edge((self, False), self._json['false_next'], table.name)  # pylint: disable=protected-access
         self._json['false_next'] = table.name
 
     false_next = property(_get_false_next, _set_false_next)
@@ -291,6 +383,7 @@ class Conditional(object):
         return self._pipeline.get_table(true_next)
 
     def _set_true_next(self, table):
+        self._pipeline._move_edge((self, True), self._json['true_next'], table.name)  # pylint: disable=protected-access
         self._json['true_next'] = table.name
 
     true_next = property(_get_true_next, _set_true_next)
@@ -348,9 +441,9 @@ class Table(object):
         self._json['actions'] = [action.name for action in actions]
 
     def set_default_next(self, table):
-        if table is None:
-            self._json['base_default_next'] = None
-        self._json['base_default_next'] = table.name
+        table_name = None if table is None else table.name
+        self._pipeline._move_edge((self, None), self._json['base_default_next'], table_name)  # pylint: disable=protected-access
+        self._json['base_default_next'] = table_name
 
     def get_default_next(self):
         table_name = self._json['base_default_next']
@@ -359,7 +452,11 @@ class Table(object):
         return self._pipeline.get_table(table_name)
 
     def set_next(self, action, table):
-        self._json['next_tables'].update({action.name : table.name})
+        table_name = None if table is None else table.name
+        self._pipeline._move_edge(  # pylint: disable=protected-access
+            (self, action.name), self._json['next_tables'].get(action.name), table_name
+        )
+        self._json['next_tables'].update({action.name : table_name})
 
     def get_next(self, action):
         table_name = self._json['next_tables'][action.name]
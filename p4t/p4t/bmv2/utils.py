@@ -1,14 +1,29 @@
-from itertools import groupby
+from collections import defaultdict
 from json import dumps as json_dumps
 
 from p4t.bmv2.classifiers import BmvBasicClassifier
+from p4t.bmv2.p4_types import Table, Conditional
+
+
+def _tables_by_name(program):
+    """ Maps a table name to the table of the first pipeline in which the name is unique. """
+    result = {}
+    for pipeline in program.pipelines:
+        for table in pipeline.tables:
+            if table.name not in result:
+                try:
+                    result[table.name] = pipeline.get_table(table.name)
+                except KeyError:
+                    pass
+    return result
 
 
 def classifiers_by_table(program, entries):
     """ Split entries by table and return list of corresponding typed VMRs.
 
     If there are multiple tables (possibly in different pipelines) that have
-    the same name, the first one is returned.
+    the same name, the first one is returned. Entries keep their relative order,
+    entries of unknown tables are dropped.
 
     Args:
         program: P4 program.
@@ -17,19 +32,15 @@ def classifiers_by_table(program, entries):
         A dict mapping table name to typed vmr.
     """
 
-    result = {}
+    entries_by_table = defaultdict(list)
+    for entry in entries:
+        entries_by_table[entry.table_name].append(entry)
 
-    for table_name, table_entries in groupby(sorted(entries), lambda x: x.table_name):
-        for pipeline in program.pipelines:
-            try:
-                result.update({
-                    table_name: BmvBasicClassifier(pipeline.get_table(table_name), table_entries)
-                })
-                break
-            except KeyError:
-                pass
-
-    return result
+    tables = _tables_by_name(program)
+    return dict(
+        (table_name, BmvBasicClassifier(tables[table_name], table_entries))
+        for table_name, table_entries in entries_by_table.items() if table_name in tables
+    )
 
 
 def chain_tables(*tables):
@@ -43,24 +54,25 @@ def chain_tables(*tables):
         prevoius = table
 
 
-def _compare_name_if_exists(lhs, rhs):
-    return lhs is not None and lhs.name == rhs.name
-
-
 def redirect_table(original, target):
+    """ Makes the tables and conditionals that lead to original lead to target.
+
+    Only the edges to original are visited, see Pipeline.predecessors. The action
+    edges of a table are redirected only if its default next is original as well.
+    """
     # TODO: check that pipelines are equal
-    for table in original.pipeline.tables:
-        # TODO: normal comparasion between primitives!!!
-        if _compare_name_if_exists(table.get_default_next(), original):
-            table.set_default_next(target)
-            for action in table.actions:
-                if _compare_name_if_exists(table.get_next(action), original):
-                    table.set_next(action, target)
-    for conditinal in original.pipeline.conditionals:
-        if _compare_name_if_exists(conditinal.false_next, original):
-            conditinal.false_next = target
-        if _compare_name_if_exists(conditinal.true_next, original):
-            conditinal.true_next = target
+    edges = original.pipeline.predecessors(original)
+    by_default = set(source for source, branch in edges if isinstance(source, Table) and branch is None)
+    for source, branch in edges:
+        if isinstance(source, Conditional):
+            if branch:
+                source.true_next = target
+            else:
+                source.false_next = target
+        elif branch is None:
+            source.set_default_next(target)
+        elif source in by_default:
+            source.set_next(source.pipeline.program.get_action(branch), target)
 
 
 def json_pp(json):
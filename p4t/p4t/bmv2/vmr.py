@@ -3,6 +3,8 @@
 from collections import namedtuple
 
 from bitstring import Bits
+import bm_runtime.standard.ttypes as bm_types
+
 from p4t.simple.vmr import check_lengths_match
 
 
@@ -24,6 +26,92 @@ class BmvVMREntry(namedtuple(
 
     __slots__ = ()
 
+    @property
+    def param_types(self):
+        """ BmMatchParamType of each key field (see BmvCompactVMREntry). """
+        return [param.type for param in self.match_key]
+
+    @property
+    def params(self):
+        """ Plain value of each key field (see BmvCompactVMREntry). """
+        return [_plain_param(param) for param in self.match_key]
+
+    @property
+    def priority(self):
+        """ Entry priority. """
+        return self.options.priority
+
+    @staticmethod
+    def isdefault():
+        """Return whether this is a default entry (see VMRDefaultEntry)."""
+        return False
+
+
+def _match_param(param_type, param):
+    """ Makes BmMatchParam from a plain key field value (see BmvCompactVMREntry). """
+    if param_type == bm_types.BmMatchParamType.EXACT:
+        return bm_types.BmMatchParam(type=param_type, exact=bm_types.BmMatchParamExact(param))
+    elif param_type == bm_types.BmMatchParamType.LPM:
+        return bm_types.BmMatchParam(type=param_type, lpm=bm_types.BmMatchParamLPM(*param))
+    elif param_type == bm_types.BmMatchParamType.TERNARY:
+        return bm_types.BmMatchParam(type=param_type, ternary=bm_types.BmMatchParamTernary(*param))
+    elif param_type == bm_types.BmMatchParamType.VALID:
+        return bm_types.BmMatchParam(type=param_type, valid=bm_types.BmMatchParamValid(param))
+    elif param_type == bm_types.BmMatchParamType.RANGE:
+        return bm_types.BmMatchParam(type=param_type, range=bm_types.BmMatchParamRange(*param))
+    else:
+        raise ValueError("Unsupported match param type: {}".format(param_type))
+
+
+def _plain_param(param):
+    """ Makes a plain key field value from BmMatchParam, the inverse of _match_param. """
+    if param.type == bm_types.BmMatchParamType.EXACT:
+        return param.exact.key
+    elif param.type == bm_types.BmMatchParamType.LPM:
+        return param.lpm.key, param.lpm.prefix_length
+    elif param.type == bm_types.BmMatchParamType.TERNARY:
+        return param.ternary.key, param.ternary.mask
+    elif param.type == bm_types.BmMatchParamType.VALID:
+        return param.valid.key
+    elif param.type == bm_types.BmMatchParamType.RANGE:
+        return param.range.start, param.range.end_
+    else:
+        raise ValueError("Unsupported match param type: {}".format(param.type))
+
+
+class BmvCompactVMREntry(namedtuple(
+        'BmvCompactVMREntry',
+        ['table_name', 'param_types', 'params', 'action_name', 'runtime_data', 'priority']
+)):
+    """ BMV2 VMR entry that keeps its match key as plain values.
+
+    It can be used in place of BmvVMREntry, Thrift objects for match_key and
+    options are made anew on each access, so readers that need only the key
+    values should use param_types and params, which both kinds of entries have.
+
+    Attributes:
+        table_name: The name of the table to which this VMR is for.
+        param_types: BmMatchParamType of each key field.
+        params: Value of each key field: key bytes for an exact match, a pair of key
+            bytes and prefix length for LPM, a pair of key and mask bytes for
+            a ternary match, a bool for a valid match and a pair of bounds for a range.
+        action_name: The name of the action to execute
+        runtime_data: List of action parameters bytes.
+        priority: Entry priority.
+    """
+
+    __slots__ = ()
+
+    @property
+    def match_key(self):
+        """ The list of BmMatchParam instances specifying the value-mask. """
+        return [_match_param(t, p) for t, p in zip(self.param_types, self.params)]
+
+    @property
+    def options(self):
+        """ Entry options. """
+        return bm_types.BmAddEntryOptions(priority=self.priority)
+
     @staticmethod
     def isdefault():
         """Return whether this is a default entry (see VMRDefaultEntry)."""
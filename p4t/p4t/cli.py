@@ -2,6 +2,7 @@
 
 import cmd
 import json
+import sys
 from itertools import chain
 
 import runtime_CLI as bm_CLI
@@ -11,6 +12,8 @@ from p4t.manager import OptimizationManager
 from p4t.bmv2.p4_types import Program
 import p4t.bmv2.vmr as vmr
 from p4t.bmv2.utils import classifiers_by_table
+from p4t.bmv2.deploy import Deployer
+from p4t.bmv2.loader import load_commands
 
 
 class TransformAPI(cmd.Cmd):
@@ -19,6 +22,10 @@ class TransformAPI(cmd.Cmd):
     prompt = 'OptmizationCmd: '
     intro = 'Optimization subshell for P4 setup'
 
+    # Optimized entries are installed over this many Thrift connections, a batch at a time
+    num_connections = 4
+    batch_size = 1024
+
     def __init__(self, runtimeAPI):
         cmd.Cmd.__init__(self)
 
@@ -38,6 +45,22 @@ class TransformAPI(cmd.Cmd):
 
         self.vmr.append(self._parse_table_set_default(line))
 
+    @bm_CLI.handle_bad_input
+    def do_load(self, line):
+        "Add entries from a file of table_add and table_set_default commands: load <file> [<num_workers>]"
+
+        args = line.split()
+        self.runtimeAPI.at_least_n_args(args, 1)
+        num_workers = int(args[1]) if len(args) > 1 else 1
+
+        try:
+            entries = list(load_commands(args[0], bm_CLI.TABLES, bm_CLI.ACTIONS, num_workers))
+        except (IOError, ValueError) as err:
+            raise bm_CLI.UIn_Error(str(err))
+        self.vmr.extend(entries)
+
+        print "{:d} entries have been loaded".format(len(entries))
+
     @bm_CLI.handle_bad_input
     def do_optimize(self, line):
         "Run optimization step: optimize <optimization_step> <step_args>"
@@ -58,19 +81,29 @@ class TransformAPI(cmd.Cmd):
             raise bm_CLI.UIn_Error(str(err))
 
         self.runtimeAPI.client.bm_load_new_config(json.dumps(json_config))
-        for entry in chain(*(vmr.entries for vmr in self.optimizer.data.vmr.values())):
-            if not entry.isdefault():
-                entry_handle = self.runtimeAPI.client.bm_mt_add_entry(
-                    0, entry.table_name, entry.match_key, entry.action_name, entry.runtime_data,
-                    entry.options
-                )
-                print "Entry has been added with handle", entry_handle
-            else:
-                self.runtimeAPI.print_set_default(entry.table_name, entry.action_name, entry.runtime_data)
-                self.runtimeAPI.client.bm_mt_set_default_action(0, entry.table_name, entry.action_name, entry.runtime_data)
+        report = self._deployer().deploy(chain(*(vmr.entries for vmr in self.optimizer.data.vmr.values())))
+        print
+        print "{:d} entries and {:d} default actions have been installed in {:.1f}s ({:.0f} entries/s)".format(
+            report.num_entries, report.num_defaults, report.seconds, report.throughput
+        )
 
         return True
 
+    def _deployer(self):
+        if self.runtimeAPI.connect is None:
+            return Deployer(lambda: self.runtimeAPI.client, 1, self.batch_size, self._print_progress)
+        return Deployer(
+            self.runtimeAPI.connect, self.num_connections, self.batch_size, self._print_progress,
+            self.runtimeAPI.disconnect
+        )
+
+    @staticmethod
+    def _print_progress(num_installed, num_entries, seconds):
+        sys.stdout.write("\rInstalled {:d}/{:d} entries ({:.0f} entries/s)".format(
+            num_installed, num_entries, num_installed / seconds if seconds > 0 else 0.0
+        ))
+        sys.stdout.flush()
+
     def do_EOF(self, _):  # pylint: disable=invalid-name,no-self-use
         """ Exit to an outer subshell. """
         print()
@@ -149,7 +182,18 @@ class TransformAPI(cmd.Cmd):
 
 
 class TRuntimeAPI(bm_CLI.RuntimeAPI):
-    """ CLI that defines additional  subshells for bm_CLI.RuntimeAPI. """
+    """ CLI that defines additional  subshells for bm_CLI.RuntimeAPI.
+
+    Attributes:
+        connect: Callable that opens a new standard Thrift client to the same switch,
+            None if only the client of the CLI may be used.
+        disconnect: Callable that closes a client opened by connect, if any.
+    """
+
+    def __init__(self, pre_type, standard_client, mc_client, connect=None, disconnect=None):
+        bm_CLI.RuntimeAPI.__init__(self, pre_type, standard_client, mc_client)
+        self.connect = connect
+        self.disconnect = disconnect
 
     def do_optimization(self, _):
         "Enter optimization subshell"
@@ -167,7 +211,17 @@ def main():
 
     bm_CLI.load_json_config(standard_client, args.json)
 
-    TRuntimeAPI(args.pre, standard_client, mc_client).cmdloop()
+    def connect():
+        return bm_CLI.thrift_connect(
+            args.thrift_ip, args.thrift_port,
+            bm_CLI.RuntimeAPI.get_thrift_services(args.pre)
+        )[0]
+
+    def disconnect(client):
+        # thrift_connect does not return the transport, all clients of a connection share it
+        client._oprot.trans.close()  # pylint: disable=protected-access
+
+    TRuntimeAPI(args.pre, standard_client, mc_client, connect, disconnect).cmdloop()
 
 if __name__ == '__main__':
     main()
@@ -1,9 +1,52 @@
-from itertools import chain, product
+from collections import namedtuple
+from itertools import chain, count, product
+from operator import itemgetter
+
+import numpy as np
 
 from p4t.simple.vmr import SVMREntry
 import p4t_native
 
 
+class PackedClassifier(namedtuple('PackedClassifier', ['value', 'mask', 'num_entries', 'width'])):
+    """ A classifier packed into contiguous buffers that p4t_native ingests without per-bit calls.
+
+    Attributes:
+        value: Buffer (bytes, array or NumPy array) with one row of whole bytes per entry,
+            bit i of an entry is stored MSB first in byte i / 8 of its row.
+        mask: Buffer with entry masks, same layout as value.
+        num_entries: The number of entries.
+        width: The number of meaningful bits in a row.
+    """
+
+    __slots__ = ()
+
+
+def pack(classifier):
+    """ Packs classifier entries into PackedClassifier.
+
+    Args:
+        classifier: Any sequence of SVMREntry, its bitwidth attribute (if any) is
+            the width of an empty classifier. Packed rows of a columnar classifier
+            (see p4t.simple.columnar) are passed as is.
+    """
+    if hasattr(classifier, 'masks'):
+        return PackedClassifier(classifier.values, classifier.masks, len(classifier), classifier.bitwidth)
+
+    values = []
+    masks = []
+    for entry in classifier:
+        values.append(entry.value)
+        masks.append(entry.mask)
+    width = len(values[-1]) if values else getattr(classifier, 'bitwidth', 0)
+    return PackedClassifier(_pack_rows(values, width), _pack_rows(masks, width), len(values), width)
+
+
+def _pack_rows(rows, width):
+    """ Packs sequences of bits into rows of whole bytes, MSB first. """
+    return np.packbits(np.array(rows, dtype=bool).reshape(len(rows), width), axis=1)
+
+
 def get_support(svmrentry):
     return tuple(i for i, x in enumerate(svmrentry.mask) if x)
 
@@ -13,14 +56,35 @@ def isprefix(bits):
 
 
 def expand(svmrentry, bits):
+    """ Lazily expands an entry, so that all the given bits become exact.
+
+    Yields the entry itself if it is already exact on the bits, otherwise an entry
+    for each assignment of the bits that are not in its mask. The expanded entries
+    share a single mask.
+    """
     bits = set(bits)
-    mask = []
-    value_options = []
-    for i, (v, m) in enumerate(zip(svmrentry.value, svmrentry.mask)):
-        mask.append(m or (i in bits))
-        value_options.append([v] if m or (i not in bits) else [True, False])
-    return [SVMREntry(mask, tuple(value), svmrentry.action, svmrentry.priority)
-            for value in product(*value_options)]
+    extra = [i for i, m in enumerate(svmrentry.mask) if not m and i in bits]
+    if not extra:
+        yield svmrentry
+        return
+
+    mask = tuple(m or (i in bits) for i, m in enumerate(svmrentry.mask))
+    value = list(svmrentry.value)
+    for assignment in product([True, False], repeat=len(extra)):
+        for i, v in zip(extra, assignment):
+            value[i] = v
+        yield SVMREntry(tuple(value), mask, svmrentry.action, svmrentry.priority)
+
+
+def expand_all(classifier, indices, expansions):
+    """ Lazily expands the classifier entries with the given indices.
+
+    Args:
+        classifier: The original classifier.
+        indices: Indices of the entries to expand.
+        expansions: For each entry of the classifier, the bits to make exact.
+    """
+    return chain.from_iterable(expand(classifier[i], expansions[i]) for i in indices)
 
 
 def _chain2diffs(bitchain):
@@ -40,10 +104,29 @@ def set_number_of_threads(num_threads):
     p4t_native.set_num_threads(num_threads)
 
 
-def optimize(classifier, factory):
+def set_log_level(level):
+    """ Sets the level of the native log: trace, debug, info, warning (default), error, critical or off. """
+    p4t_native.set_log_level(level)
+
+
+def new_stats():
+    """ Creates an object that the optimize functions fill with phase timings and counters.
+
+    Pass it as the `stats` argument, then read its `timings` (seconds per phase)
+    and `counters` (graph sizes, iterations, comparisons) dicts.
+    """
+    return p4t_native.Stats()
+
+
+def set_log_sink(sink):
+    """ Redirects the native log to a file, stdout, stderr (default) or null (discard). """
+    p4t_native.set_log_sink(sink)
+
+
+def optimize(classifier, factory, stats=None):
     prefix = classifier.name + "_p4t_lpm"
 
-    partition, partition_indices = p4t_native.min_pmgr(classifier)
+    partition, partition_indices = p4t_native.min_pmgr(pack(classifier), stats=stats)
     subclassifiers = []
 
     for bitchain, indices in zip(partition, partition_indices):
@@ -54,8 +137,82 @@ def optimize(classifier, factory):
     return subclassifiers
 
 
-def optimize_bounded(classifiers, factory, max_num_groups):
-    partitions, n_partition_indices = p4t_native.min_bmgr(classifiers, max_num_groups)
+class IncrementalOptimizer(object):
+    """ Keeps the result of `optimize` up to date while entries are added and removed.
+
+    Only the groups affected by an update are rebuilt, so the cost of an update
+    is proportional to the churn rather than to the classifier size. Entries of
+    a subclassifier keep the order in which they were added to the classifier.
+    """
+
+    def __init__(self, classifier, factory):
+        self._prefix = classifier.name + "_p4t_lpm"
+        self._empty = classifier.subset("_", [])
+        self._factory = factory
+
+        self._order = count()
+        self._entries = {}  # support -> list of (order, entry)
+        for entry in classifier:
+            self._add_entry(entry)
+
+        self._partition = p4t_native.ChainPartition(pack(classifier))
+        self._bitchains = {}
+        self._subclassifiers = {}
+        for group, bitchain in self._partition.groups().items():
+            self._rebuild(group, bitchain)
+
+    @property
+    def subclassifiers(self):
+        """ A dict mapping a group id to its subclassifier. """
+        return self._subclassifiers
+
+    def add(self, entry):
+        """ Adds an entry.
+
+        Returns:
+            A pair of a dict with rebuilt subclassifiers and a list of removed group ids.
+        """
+        self._add_entry(entry)
+        groups, removed, _ = self._partition.add(entry)
+        return self._update(groups, removed, self._partition.group_of(entry))
+
+    def remove(self, entry):
+        """ Removes an entry, see `add` for the return value. """
+        support = get_support(entry)
+        group = self._partition.group_of(entry)
+        entries = self._entries[support]
+        del entries[next(i for i, (_, other) in enumerate(entries) if other == entry)]
+        if not entries:
+            del self._entries[support]
+        groups, removed, _ = self._partition.remove(entry)
+        return self._update(groups, removed, group)
+
+    def _add_entry(self, entry):
+        self._entries.setdefault(get_support(entry), []).append((next(self._order), entry))
+
+    def _update(self, groups, removed, entry_group):
+        for group in removed:
+            del self._bitchains[group]
+            del self._subclassifiers[group]
+        if entry_group not in removed and entry_group not in groups:
+            groups[entry_group] = self._bitchains[entry_group]
+        for group, bitchain in groups.items():
+            self._rebuild(group, bitchain)
+        return dict((group, self._subclassifiers[group]) for group in groups), removed
+
+    def _rebuild(self, group, bitchain):
+        subclassifier = self._empty.subset("_", [])
+        entries = chain.from_iterable(self._entries.get(tuple(support), ()) for support in bitchain)
+        for _, entry in sorted(entries, key=itemgetter(0)):
+            subclassifier.add(entry)
+        self._bitchains[group] = bitchain
+        self._subclassifiers[group] = self._factory.reordering_classifier(
+            self._prefix + "_1", subclassifier, _chain2bits(bitchain)
+        )
+
+
+def optimize_bounded(classifiers, factory, max_num_groups, stats=None):
+    partitions, n_partition_indices = p4t_native.min_bmgr([pack(c) for c in classifiers], max_num_groups, stats=stats)
 
     subclassifiers = []
     traditionals = []
@@ -72,38 +229,84 @@ def optimize_bounded(classifiers, factory, max_num_groups):
     return subclassifiers, traditionals
 
 
-def optimize_lpm_bounded_memory(classifiers, factory, max_memory):
-    partitions, n_partition_indices_n_exp = p4t_native.min_pmgr_w_expansions(classifiers, max_memory)
+def optimize_lpm_bounded_memory(classifiers, factory, max_memory, non_expanded=True, stats=None):
+    """ Splits classifiers into LPM groups expanding entries within the memory budget.
+
+    Entries are expanded lazily group by group, so only one expanded group exists
+    besides the resulting subclassifiers.
+
+    Args:
+        classifiers: Classifiers to optimize.
+        factory: Factory of the resulting subclassifiers.
+        max_memory: The maximal total number of entries after expansion.
+        non_expanded: Whether to also build the groups without expansion, which
+            can be turned off to save memory.
+        stats: Optional p4t_native.Stats to collect phase timings and counters.
+
+    Returns:
+        A pair of the list of subclassifiers and the list of the corresponding
+        non-expanded subclassifiers, None if non_expanded is not set.
+    """
+    partitions, n_partition_indices_n_exp = p4t_native.min_pmgr_w_expansions(
+        [pack(c) for c in classifiers], max_memory, stats=stats
+    )
 
     subclassifiers = []
-    non_expanded_subclassifiers = []
+    non_expanded_subclassifiers = [] if non_expanded else None
     for classifier, (partition, (partition_indices, expansions)) in zip(classifiers, zip(partitions, n_partition_indices_n_exp)):
         prefix = classifier.name + "_p4t_lpm"
         for bitchain, indices in zip(partition, partition_indices):
             expanded = classifier.subset("_", [])
-            for i in indices:
-                for entry in expand(classifier[i], expansions[i]):
-                    expanded.add(entry)
+            for entry in expand_all(classifier, indices, expansions):
+                expanded.add(entry)
             subclassifiers.append(factory.reordering_classifier(
                 prefix + "_1", expanded, _chain2bits(bitchain)
             ))
 
-            non_expanded_subclassifiers.append(factory.reordering_classifier(
-                prefix + "_1", classifier.subset("_", indices), _chain2bits(bitchain)
-            ))
+            if non_expanded:
+                non_expanded_subclassifiers.append(factory.reordering_classifier(
+                    prefix + "_1", classifier.subset("_", indices), _chain2bits(bitchain)
+                ))
 
     return subclassifiers, non_expanded_subclassifiers
 
 
-def optimize_oi(classifier, factory, max_width, algo, only_exact=False, max_num_groups=None):
+def optimize_oi(classifier, factory, max_width, algo, only_exact=False, max_num_groups=None, progress=None, stats=None):
+    """ Greedily splits off subgroups that are order-independent on at most max_width bits.
+
+    All the subgroups are found by a single p4t_native.best_subgroups call, which
+    keeps the entries resident between iterations.
+
+    Args:
+        classifier: Classifier to optimize.
+        factory: Factory of the resulting subclassifiers.
+        max_width: The maximal number of bits of a subgroup.
+        algo: Subgroup selection algorithm: min_similarity, icnp_oi or icnp_blockers.
+        only_exact: Whether subgroups may use only the bits that are exact in all their entries.
+        max_num_groups: The maximal number of subgroups, unlimited if None.
+        progress: Optional callable, called with the number of subgroups found so far
+            and the number of remaining entries after each subgroup.
+        stats: Optional p4t_native.Stats to collect phase timings and counters.
+
+    Returns:
+        A pair of the list of subclassifiers and the classifier of the remaining entries.
+    """
     prefix = classifier.name + "_p4t_lpm"
 
+    n_bits, n_indices = p4t_native.best_subgroups(
+        pack(classifier), max_width, algo, only_exact,
+        max_num_groups=-1 if max_num_groups is None else max_num_groups,
+        progress=progress, stats=stats
+    )
+    if not n_bits:
+        return [], classifier
+
     subclassifiers = []
-    while (max_num_groups is None or len(subclassifiers) < max_num_groups) and len(classifier) > 0:
-        bits, indices = p4t_native.best_subgroup(classifier, max_width, only_exact, algo)
+    for bits, indices in zip(n_bits, n_indices):
         subclassifiers.append(factory.reordering_classifier(
             prefix + "_1", classifier.subset("_", indices), bits
             ))
-        classifier = classifier.subset(classifier.name, set(range(len(classifier))) - set(indices))
 
-    return subclassifiers, classifier
+    selected = set(chain.from_iterable(n_indices))
+    remaining = [i for i in range(len(classifier)) if i not in selected]
+    return subclassifiers, classifier.subset(classifier.name, remaining)
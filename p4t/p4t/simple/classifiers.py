@@ -3,6 +3,9 @@ from p4t.simple.primitives import FPCAction
 
 # TODO: check correct copying of entries
 
+# Default action of a view that has not been set explicitly
+_INHERITED = object()
+
 
 class BasicClassifier(object):
     def __init__(self, name, bitwidth, vmr=None, default_action=None):
@@ -26,6 +29,9 @@ class BasicClassifier(object):
         self._vmr.append(entry)
 
     def subset(self, name, indices):
+        return ClassifierView(name, self, indices)
+
+    def _copy_subset(self, name, indices):
         return BasicClassifier(
             name, self.bitwidth,
             (self._vmr[i] for i in indices),
@@ -45,6 +51,108 @@ class BasicClassifier(object):
             raise ValueError("VMR has wrong bit length")
 
 
+class ClassifierView(object):
+    """ A subset of a classifier that refers to the entries of its parent by index.
+
+    Creating a view costs O(len(indices)) and does not copy entries. Entries are read
+    from the parent until the view is modified, then it is materialized into a copy
+    of the parent type. A view of a view refers to the original parent.
+    """
+
+    def __init__(self, name, parent, indices):
+        if isinstance(parent, ClassifierView) and parent._materialized is None:
+            indices = [parent._indices[i] for i in indices]
+            parent = parent._parent
+        self._name = name
+        self._parent = parent
+        self._indices = list(indices)
+        self._default_action = _INHERITED
+        self._materialized = None
+
+    def __len__(self):
+        if self._materialized is not None:
+            return len(self._materialized)
+        return len(self._indices)
+
+    def __getitem__(self, i):
+        if self._materialized is not None:
+            return self._materialized[i]
+        return self._parent[self._indices[i]]
+
+    def __iter__(self):
+        if self._materialized is not None:
+            return iter(self._materialized)
+        return (self._parent[i] for i in self._indices)
+
+    def add(self, entry):
+        self._materialize().add(entry)
+
+    def subset(self, name, indices):
+        return ClassifierView(name, self if self._materialized is None else self._materialized, indices)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def bitwidth(self):
+        return self._parent.bitwidth
+
+    @property
+    def bits(self):
+        return self._parent.bits
+
+    @property
+    def table(self):
+        return self._parent.table
+
+    @property
+    def values(self):
+        """ Packed values if the parent keeps them (see p4t.simple.columnar). """
+        return self._source().values[self._rows()]
+
+    @property
+    def masks(self):
+        """ Packed masks if the parent keeps them (see p4t.simple.columnar). """
+        return self._source().masks[self._rows()]
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @property
+    def indices(self):
+        """ Indices of the entries in the parent. """
+        return self._indices
+
+    @property
+    def default_action(self):
+        if self._materialized is not None:
+            return self._materialized.default_action
+        if self._default_action is _INHERITED:
+            return self._parent.default_action
+        return self._default_action
+
+    @default_action.setter
+    def default_action(self, action):
+        if self._materialized is not None:
+            self._materialized.default_action = action
+        self._default_action = action
+
+    def _source(self):
+        return self._materialized if self._materialized is not None else self._parent
+
+    def _rows(self):
+        return slice(None) if self._materialized is not None else self._indices
+
+    def _materialize(self):
+        if self._materialized is None:
+            self._materialized = self._parent._copy_subset(self._name, self._indices)
+            if self._default_action is not _INHERITED:
+                self._materialized.default_action = self._default_action
+        return self._materialized
+
+
 class MultigroupClassifier(object):
     def __init__(self, name, subclassifiers):
         self._name = name
@@ -76,10 +184,10 @@ class ReorderingClassifier(BasicClassifier):
 
     @classmethod
     def from_classifier(cls, name, classifier, bits):
-        assert(isinstance(classifier, BasicClassifier))
+        assert(isinstance(classifier, (BasicClassifier, ClassifierView)))
         return cls.from_original_vmr(name, bits, classifier, classifier.default_action)
 
-    def subset(self, name, indices):
+    def _copy_subset(self, name, indices):
         return ReorderingClassifier(
             name, self.bits,
             (self._vmr[i] for i in indices),
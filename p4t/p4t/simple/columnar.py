@@ -0,0 +1,249 @@
+""" Classifiers that keep their entries column-wise in packed NumPy bit matrices.
+
+A row of a value or a mask matrix holds the bits of an entry MSB first, which is
+the layout of p4t.optimizations.lpm.PackedClassifier, so an entry takes about
+2 * bitwidth / 8 bytes plus its action id and priority. Entries are materialized
+as SVMREntry only when accessed.
+"""
+
+import numpy as np
+
+from p4t.simple.vmr import SVMREntry
+from p4t.simple.primitives import FPCAction
+from p4t.simple.classifiers import MultigroupClassifier
+
+_NO_PRIORITY = np.iinfo(np.int64).min
+_NO_ORIGIN = -1
+
+# Rows are unpacked in chunks of this size when columns are gathered
+_CHUNK_ROWS = 1 << 16
+
+
+def _row_size(bitwidth):
+    return (bitwidth + 7) // 8
+
+
+def _pack_bits(bits, bitwidth):
+    return np.packbits(np.fromiter((bool(x) for x in bits), dtype=np.uint8, count=bitwidth))
+
+
+def _unpack_bits(row, bitwidth):
+    return tuple(np.unpackbits(row)[:bitwidth].astype(bool).tolist())
+
+
+def _action_key(action):
+    """ Returns a key under which equal actions share their id, unhashable ones are keyed by repr. """
+    try:
+        hash(action)
+    except TypeError:
+        return type(action), repr(action)
+    return action
+
+
+def _gather_columns(matrix, bits):
+    """ Builds a packed bit matrix from the given columns of another one. """
+    bits = np.asarray(bits, dtype=np.intp)
+    result = np.zeros((len(matrix), _row_size(len(bits))), dtype=np.uint8)
+    for start in range(0, len(matrix), _CHUNK_ROWS):
+        chunk = np.unpackbits(matrix[start:start + _CHUNK_ROWS], axis=1)
+        result[start:start + _CHUNK_ROWS] = np.packbits(chunk[:, bits], axis=1)
+    return result
+
+
+class ColumnarClassifier(object):
+    """ Classifier with the interface of BasicClassifier that stores entries column-wise.
+
+    Actions are kept as ids in the table of distinct actions, a priority of None
+    is stored as a reserved value.
+    """
+
+    def __init__(self, name, bitwidth, vmr=None, default_action=None):
+        self._name = name
+        self._bitwidth = bitwidth
+        self.default_action = default_action
+
+        self._size = 0
+        self._values = np.zeros((0, _row_size(bitwidth)), dtype=np.uint8)
+        self._masks = np.zeros((0, _row_size(bitwidth)), dtype=np.uint8)
+        self._action_ids = np.zeros(0, dtype=np.int32)
+        self._priorities = np.zeros(0, dtype=np.int64)
+
+        self._actions = []
+        self._action2id = {}
+
+        if vmr is not None:
+            for entry in vmr:
+                self.add(entry)
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i):
+        if not -self._size <= i < self._size:
+            raise IndexError("classifier index out of range")
+        i %= self._size
+        priority = self._priorities[i]
+        return SVMREntry(
+            _unpack_bits(self._values[i], self._bitwidth),
+            _unpack_bits(self._masks[i], self._bitwidth),
+            self._action(i),
+            None if priority == _NO_PRIORITY else int(priority)
+        )
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    def add(self, entry):
+        self._check_entry_length(entry)
+        self._reserve(self._size + 1)
+
+        key = _action_key(entry.action)
+        action_id = self._action2id.get(key)
+        if action_id is None:
+            action_id = self._action2id[key] = len(self._actions)
+            self._actions.append(entry.action)
+
+        i = self._size
+        self._values[i] = _pack_bits(entry.value, self._bitwidth)
+        self._masks[i] = _pack_bits(entry.mask, self._bitwidth)
+        self._action_ids[i] = action_id
+        self._priorities[i] = _NO_PRIORITY if entry.priority is None else entry.priority
+        self._size += 1
+
+    def subset(self, name, indices):
+        return self._select(
+            ColumnarClassifier(name, self.bitwidth, default_action=self.default_action),
+            np.fromiter(indices, dtype=np.intp)
+        )
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def bitwidth(self):
+        return self._bitwidth
+
+    @property
+    def values(self):
+        """ Packed values, a row per entry. """
+        return self._values[:self._size]
+
+    @property
+    def masks(self):
+        """ Packed masks, a row per entry. """
+        return self._masks[:self._size]
+
+    def _action(self, i):
+        return self._actions[self._action_ids[i]]
+
+    def _columns(self):
+        """ Names of the arrays that hold a row per entry. """
+        return ['_values', '_masks', '_action_ids', '_priorities']
+
+    def _reserve(self, size):
+        capacity = len(self._action_ids)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 16)
+        for column in self._columns():
+            old = getattr(self, column)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, column, new)
+
+    def _select(self, result, rows):
+        """ Fills result with the given rows. """
+        for column in self._columns():
+            setattr(result, column, getattr(self, column)[:self._size][rows])
+        result._size = len(rows)
+        result._actions = list(self._actions)
+        result._action2id = dict(self._action2id)
+        return result
+
+    def _check_entry_length(self, entry):
+        if len(entry.value) != self._bitwidth:
+            raise ValueError("VMR has wrong bit length")
+
+
+class ColumnarReorderingClassifier(ColumnarClassifier):
+    """ Columnar counterpart of ReorderingClassifier.
+
+    When built from a columnar classifier, the bits are gathered column-wise and the
+    entries remember their rows in it, so that the actions (FPCAction if some bits
+    are dropped) are made only when the entries are accessed.
+    """
+
+    def __init__(self, name, bits, vmr=None, default_action=None):
+        self._bits = bits
+        self._origin = None
+        self._origin_is_fpc = False
+        self._origin_rows = np.zeros(0, dtype=np.int32)
+
+        super(ColumnarReorderingClassifier, self).__init__(name, len(bits), vmr, default_action)
+
+    @classmethod
+    def from_original_vmr(cls, name, bits, original_vmr=None, default_action=None):
+        result = cls(name, bits, default_action=default_action)
+        if original_vmr is not None:
+            for entry in original_vmr:
+                mask = [entry.mask[j] for j in bits]
+                key = [entry.value[j] for j in bits]
+                action = entry.action if len(bits) == len(entry.mask) else FPCAction(entry)
+                result.add(SVMREntry(key, mask, action, entry.priority))
+        return result
+
+    @classmethod
+    def from_classifier(cls, name, classifier, bits):
+        if not isinstance(classifier, ColumnarClassifier):
+            return cls.from_original_vmr(name, bits, classifier, classifier.default_action)
+
+        size = len(classifier)
+        result = cls(name, bits, default_action=classifier.default_action)
+        result._size = size
+        result._values = _gather_columns(classifier.values, bits)
+        result._masks = _gather_columns(classifier.masks, bits)
+        result._action_ids = np.zeros(size, dtype=np.int32)
+        result._priorities = classifier._priorities[:size].copy()
+        result._origin = classifier
+        result._origin_is_fpc = len(bits) != classifier.bitwidth
+        result._origin_rows = np.arange(size, dtype=np.int32)
+        return result
+
+    def add(self, entry):
+        super(ColumnarReorderingClassifier, self).add(entry)
+        self._origin_rows[self._size - 1] = _NO_ORIGIN
+
+    def subset(self, name, indices):
+        result = self._select(
+            ColumnarReorderingClassifier(name, self.bits, default_action=self.default_action),
+            np.fromiter(indices, dtype=np.intp)
+        )
+        result._origin = self._origin
+        result._origin_is_fpc = self._origin_is_fpc
+        return result
+
+    @property
+    def bits(self):
+        return self._bits
+
+    def _action(self, i):
+        row = self._origin_rows[i]
+        if row == _NO_ORIGIN:
+            return super(ColumnarReorderingClassifier, self)._action(i)
+        entry = self._origin[row]
+        return FPCAction(entry) if self._origin_is_fpc else entry.action
+
+    def _columns(self):
+        return super(ColumnarReorderingClassifier, self)._columns() + ['_origin_rows']
+
+
+class ColumnarClassifierFactory(object):
+    @staticmethod
+    def reordering_classifier(name, classifier, bits):
+        return ColumnarReorderingClassifier.from_classifier(name, classifier, bits)
+
+    @staticmethod
+    def multigroup_classifier(name, subclassifiers):
+        return MultigroupClassifier(name, subclassifiers)
@@ -1,13 +1,15 @@
-#include <boost/graph/adjacency_list.hpp>
-#include <boost/graph/max_cardinality_matching.hpp>
-#include <boost/graph/breadth_first_search.hpp>
-#include <boost/graph/successive_shortest_path_nonnegative_weights.hpp>
+#include <algorithm>
+#include <functional>
+#include <limits>
+#include <memory>
+#include <numeric>
+#include <queue>
+#include <tuple>
 
 #include "chain_algos.h"
 
 namespace {
 
-using namespace boost;
 using namespace p4t;
 
 using p4t::tuple;
@@ -15,40 +17,35 @@ using p4t::pair;
 using std::begin;
 using std::end;
 
-using MaxMatchingGraph = adjacency_list<vecS, vecS, undirectedS>;
+auto constexpr NO_MATE = -1;
 
-using AntichainGraph = adjacency_list<vecS, vecS, directedS>;
+// Bipartite graph in CSR form, left vertex u is adjacent to right vertices
+// targets[offsets[u]], ..., targets[offsets[u + 1] - 1]
+struct BipartiteGraph {
+    vector<int> offsets;
+    vector<int> targets;
 
-using MinCostMaxFlowTraits = adjacency_list_traits<vecS, vecS, directedS>;
-using MinCostMaxFlowGraph = adjacency_list<vecS, vecS, directedS, no_property,
-        property<edge_capacity_t, int,
-            property<edge_residual_capacity_t, int,
-                property<edge_reverse_t, MinCostMaxFlowTraits::edge_descriptor,
-                    property<edge_weight_t, int>
-                >
-            >
-        >
-    >;
+    auto num_left() const {
+        return int(offsets.size()) - 1;
+    }
+};
 
-template<class VD>
-auto calculate_chains(vector<Support> const& ss, vector<VD> const& mate, VD absent) {
+template<size_t W>
+auto calculate_chains(vector<Support<W>> const& ss, vector<int> const& mate) {
     // Note that vertices mapped to itself are not considered start  vertices and, thus, they won't be added to any chain 
     vector<bool> is_chain_start(ss.size(), true);
-    for (VD i = 0; i < ss.size(); i++) {
-        if (mate[i] != absent) {
-            is_chain_start[mate[i] - ss.size()] = false;
+    for (auto i = 0u; i < ss.size(); i++) {
+        if (mate[i] != NO_MATE) {
+            is_chain_start[mate[i]] = false;
         }
     }
 
-    vector<vector<Support>> result{}; 
-    for (VD i = 0; i < ss.size(); ++i) {
+    vector<vector<Support<W>>> result{}; 
+    for (auto i = 0u; i < ss.size(); ++i) {
         if (is_chain_start[i]) {
-            vector<Support> chain{};
-            for (VD j = i; j != absent; j = mate[j] - ss.size()) {
+            vector<Support<W>> chain{};
+            for (auto j = int(i); j != NO_MATE; j = mate[j]) {
                 chain.emplace_back(ss[j]);
-                if (mate[j] == absent) {
-                    break;
-                }
             }
             result.emplace_back(chain);
         }
@@ -56,315 +53,1131 @@ auto calculate_chains(vector<Support> const& ss, vector<VD> const& mate, VD abse
     return result;
 }
 
-template<class Graph>
-auto add_dilworths_edges(vector<Support> const& ss, Graph& g) {
-    using VD = graph_traits<MaxMatchingGraph>::vertex_descriptor;
-
-    for (VD i = 0; i < ss.size(); i++) {
-        for (VD j = 0; j < ss.size(); j++) {
-            if (is_subset(ss[i], ss[j]) && ss[i] != ss[j]) {
-                add_edge(i, ss.size() + j, g);
+// Left vertex i is connected to right vertex j iff ss[j] is a proper subset of ss[i].
+// Note that the edges must stay transitively closed: matching over the transitive reduction
+// would give a vertex-disjoint path cover, which can be larger than the minimal chain partition.
+template<size_t W>
+auto construct_dilworths_graph(vector<Support<W>> const& ss) -> BipartiteGraph {
+    // Only strictly smaller supports can be proper subsets
+    vector<int> by_size(ss.size());
+    iota(begin(by_size), end(by_size), 0);
+    std::stable_sort(begin(by_size), end(by_size), [&ss](auto i, auto j) {
+        return ss[i].size() < ss[j].size();
+    });
+
+    BipartiteGraph g{};
+    g.offsets.reserve(ss.size() + 1);
+    g.offsets.emplace_back(0);
+    for (auto i = 0u; i < ss.size(); i++) {
+        auto const smaller_end = std::partition_point(begin(by_size), end(by_size), [&ss, i](auto j) {
+            return ss[j].size() < ss[i].size();
+        });
+        for (auto it = begin(by_size); it != smaller_end; ++it) {
+            if (is_subset(ss[i], ss[*it])) {
+                g.targets.emplace_back(*it);
             }
         }
+        g.offsets.emplace_back(g.targets.size());
     }
+
+    return g;
 }
 
-auto construct_dilworths_mates(vector<Support> const& ss) {
-    using VD = graph_traits<MaxMatchingGraph>::vertex_descriptor;
+// Hopcroft-Karp maximum matching that starts from the given one, returns mates of the left vertices
+auto max_bipartite_matching(BipartiteGraph const& g, int num_right, vector<int> mate_left) -> vector<int> {
+    auto constexpr INF = std::numeric_limits<int>::max();
+    auto const n = g.num_left();
 
-    MaxMatchingGraph g{2 * ss.size()};
+    vector<int> mate_right(num_right, NO_MATE);
+    for (auto u = 0; u < n; u++) {
+        if (mate_left[u] != NO_MATE) {
+            mate_right[mate_left[u]] = u;
+        }
+    }
+    vector<int> dist(n);
+    vector<int> next_edge(n);
+    vector<int> queue{};
+    vector<int> stack{};
+
+    auto layer = [&] {
+        queue.clear();
+        for (auto u = 0; u < n; u++) {
+            dist[u] = mate_left[u] == NO_MATE ? 0 : INF;
+            if (dist[u] == 0) {
+                queue.emplace_back(u);
+            }
+        }
 
-    add_dilworths_edges(ss, g);
+        auto found = false;
+        for (auto k = 0u; k < queue.size(); k++) {
+            auto const u = queue[k];
+            for (auto e = g.offsets[u]; e < g.offsets[u + 1]; e++) {
+                auto const w = mate_right[g.targets[e]];
+                if (w == NO_MATE) {
+                    found = true;
+                } else if (dist[w] == INF) {
+                    dist[w] = dist[u] + 1;
+                    queue.emplace_back(w);
+                }
+            }
+        }
+        return found;
+    };
+
+    // Iterative DFS along the layers, augments the matching if succeeds
+    auto augment = [&] (int root) {
+        stack.assign(1, root);
+        while (!stack.empty()) {
+            auto const u = stack.back();
+            if (next_edge[u] == g.offsets[u + 1]) {
+                dist[u] = INF;
+                stack.pop_back();
+                continue;
+            }
 
-    vector<VD> mate(2 * ss.size());
-    auto const success = checked_edmonds_maximum_cardinality_matching(g, &mate[0]);
-    assert(success);
+            auto const w = mate_right[g.targets[next_edge[u]]];
+            if (w == NO_MATE) {
+                for (auto x : stack) {
+                    auto const v = g.targets[next_edge[x]];
+                    mate_left[x] = v;
+                    mate_right[v] = x;
+                }
+                return true;
+            } else if (dist[w] == dist[u] + 1) {
+                stack.emplace_back(w);
+            } else {
+                next_edge[u]++;
+            }
+        }
+        return false;
+    };
+
+    while (layer()) {
+        copy(begin(g.offsets), end(g.offsets) - 1, begin(next_edge));
+        for (auto u = 0; u < n; u++) {
+            if (mate_left[u] == NO_MATE) {
+                augment(u);
+            }
+        }
+    }
 
-    return mate;
+    return mate_left;
 }
 
-auto find_max_antichain(vector<Support> const& ss) -> vector<size_t> {
-    using VD = graph_traits<AntichainGraph>::vertex_descriptor;
-    auto const mate = construct_dilworths_mates(ss);
+// Min-cost matching of the given size over the edges of g, which cost nothing, and the edges
+// (u, u) of cost weights[u]. This is the flow problem behind the bounded chain partition:
+// vertices matched to themselves are dropped from chains at the cost of their weights.
+// The matching starts from the given zero-cost one, which must be maximum over the edges of g,
+// and is then grown by the primal-dual method: Dijkstra with potentials finds the distance
+// to the sink, after which as many vertex-disjoint tight augmenting paths as possible are used.
+// Capacities are unit, so the flow is kept in the mate arrays and no reverse edges are stored.
+auto min_cost_bounded_matching(BipartiteGraph const& g, vector<int> const& weights, 
+        vector<int> mate_left, int size) -> vector<int> {
+    using cost_t = long long;
+    auto constexpr INF = std::numeric_limits<cost_t>::max() / 4;
+    auto const n = g.num_left();
+
+    auto matched = int(count_if(begin(mate_left), end(mate_left), [] (auto x) { return x != NO_MATE; }));
+    for (auto u = n - 1; u >= 0 && matched > size; u--) {
+        if (mate_left[u] != NO_MATE) {
+            mate_left[u] = NO_MATE;
+            matched--;
+        }
+    }
+
+    vector<int> mate_right(n, NO_MATE);
+    for (auto u = 0; u < n; u++) {
+        if (mate_left[u] != NO_MATE) {
+            mate_right[mate_left[u]] = u;
+        }
+    }
+
+    auto cost = [&weights] (int u, int v) -> cost_t {
+        return u == v ? weights[u] : 0;
+    };
+    // Calls f(v, cost) for every edge (u, v) including the self edge
+    auto for_each_edge = [&g, &cost] (int u, auto f) {
+        for (auto e = g.offsets[u]; e < g.offsets[u + 1]; e++) {
+            f(g.targets[e], 0);
+        }
+        f(u, cost(u, u));
+    };
+
+    // Nodes are left vertices [0, n), right vertices [n, 2n) and the sink 2n
+    auto const sink = 2 * n;
+    vector<cost_t> potential(2 * n + 1, 0);
+    vector<cost_t> dist(2 * n + 1);
+    vector<int> next_edge(n);
+    vector<int> seen(2 * n, 0);
+    auto phase = 0;
+
+    while (matched < size) {
+        fill(begin(dist), end(dist), INF);
+        using item_t = pair<cost_t, int>;
+        std::priority_queue<item_t, vector<item_t>, std::greater<>> queue{};
+        for (auto u = 0; u < n; u++) {
+            if (mate_left[u] == NO_MATE) {
+                dist[u] = 0;
+                queue.emplace(0, u);
+            }
+        }
+
+        while (!queue.empty()) {
+            auto const d = queue.top().first;
+            auto const x = queue.top().second;
+            queue.pop();
+            if (d > dist[x]) {
+                continue;
+            }
+            if (x == sink) {
+                break;
+            }
+
+            auto relax = [&dist, &queue] (int y, cost_t nd) {
+                if (nd < dist[y]) {
+                    dist[y] = nd;
+                    queue.emplace(nd, y);
+                }
+            };
+            if (x < n) {
+                for_each_edge(x, [&] (int v, cost_t c) {
+                    if (v != mate_left[x]) {
+                        relax(n + v, d + c + potential[x] - potential[n + v]);
+                    }
+                });
+            } else if (mate_right[x - n] == NO_MATE) {
+                relax(sink, d + potential[x] - potential[sink]);
+            } else {
+                auto const u = mate_right[x - n];
+                relax(u, d - cost(u, x - n) + potential[x] - potential[u]);
+            }
+        }
 
-    AntichainGraph g{2 * ss.size() + 1};
-    auto const source = 2 * ss.size();
+        auto const sink_dist = dist[sink];
+        assert(sink_dist < INF);
+        for (auto x = 0; x <= sink; x++) {
+            potential[x] += std::min(dist[x], sink_dist);
+        }
 
-    add_dilworths_edges(ss, g);
+        // Augment along vertex-disjoint paths of zero reduced cost
+        phase++;
+        auto const matched_before = matched;
+        auto is_tight = [&potential, &cost, n] (int u, int v) {
+            return cost(u, v) + potential[u] - potential[n + v] == 0;
+        };
+        for (auto u = 0; u < n && matched < size; u++) {
+            if (mate_left[u] != NO_MATE) {
+                continue;
+            }
+            vector<int> stack{u};
+            vector<int> via{};
+            seen[u] = phase;
+            next_edge[u] = g.offsets[u];
+            while (!stack.empty()) {
+                auto const x = stack.back();
+                // Edges of x are g's edges followed by the self edge
+                if (next_edge[x] > g.offsets[x + 1]) {
+                    stack.pop_back();
+                    if (!via.empty()) {
+                        via.pop_back();
+                    }
+                    continue;
+                }
+                auto const v = next_edge[x] < g.offsets[x + 1] ? g.targets[next_edge[x]] : x;
+                next_edge[x]++;
+                if (v == mate_left[x] || seen[n + v] == phase || !is_tight(x, v)) {
+                    continue;
+                }
+                seen[n + v] = phase;
+
+                if (mate_right[v] == NO_MATE) {
+                    if (potential[n + v] != potential[sink]) {
+                        continue;
+                    }
+                    via.emplace_back(v);
+                    for (auto k = 0u; k < stack.size(); k++) {
+                        mate_left[stack[k]] = via[k];
+                        mate_right[via[k]] = stack[k];
+                    }
+                    matched++;
+                    break;
+                }
 
-    for (VD i = 0; i < ss.size(); i++) {
-        // TODO: I don't like that we must know what the type of "no_mate" is.
-        if (mate[i] != graph_traits<MaxMatchingGraph>::null_vertex()) {
-            remove_edge(i, mate[i], g);
-            add_edge(mate[i], i, g);
+                auto const w = mate_right[v];
+                if (seen[w] != phase && cost(w, v) + potential[w] - potential[n + v] == 0) {
+                    seen[w] = phase;
+                    next_edge[w] = g.offsets[w];
+                    stack.emplace_back(w);
+                    via.emplace_back(v);
+                }
+            }
+        }
+        assert(matched > matched_before);
+    }
+
+    return mate_left;
+}
+
+template<size_t W>
+auto is_proper_subset(Support<W> const& lhs, Support<W> const& rhs) {
+    return is_subset(rhs, lhs) && lhs != rhs;
+}
+
+// Visits supports from the largest to the smallest appending each one to the first chain
+// whose tail contains it. Takes O(n * #chains), which is near-linear for (nearly) LPM tables.
+template<size_t W>
+auto find_greedy_mates(vector<Support<W>> const& ss) -> vector<int> {
+    vector<int> by_size(ss.size());
+    iota(begin(by_size), end(by_size), 0);
+    std::stable_sort(begin(by_size), end(by_size), [&ss](auto i, auto j) {
+        return ss[i].size() > ss[j].size();
+    });
+
+    vector<int> mate(ss.size(), NO_MATE);
+    vector<int> tails{};
+    for (auto i : by_size) {
+        auto const tail = find_if(begin(tails), end(tails), [&ss, i](auto t) {
+            return is_proper_subset(ss[i], ss[t]);
+        });
+        if (tail != end(tails)) {
+            mate[*tail] = i;
+            *tail = i;
         } else {
-            add_edge(source, i, g);
+            tails.emplace_back(i);
         }
     }
-    
-    vector<graph_traits<AntichainGraph>::vertices_size_type> distance(num_vertices(g), 0);
-    breadth_first_search(g, source, visitor(make_bfs_visitor(record_distances(&distance[0], on_tree_edge()))));
 
+    return mate;
+}
+
+auto chain_tails(vector<int> const& mate) -> vector<size_t> {
     vector<size_t> result{};
-    for (VD i = 0; i < ss.size(); i++) {
-        if (distance[i] != 0 && distance[i + ss.size()] == 0) {
+    for (auto i = 0u; i < mate.size(); i++) {
+        if (mate[i] == NO_MATE) {
             result.emplace_back(i);
         }
     }
+    return result;
+}
 
-    auto const num_edges = count_if(begin(mate), begin(mate) + ss.size(), [] (auto const x) { return x != graph_traits<MaxMatchingGraph>::null_vertex(); });
+template<size_t W>
+auto is_antichain(vector<size_t> const& elements, vector<Support<W>> const& ss) {
+    for (auto i = 0u; i < elements.size(); i++) {
+        for (auto j = 0u; j < elements.size(); j++) {
+            if (i != j && is_proper_subset(ss[elements[i]], ss[elements[j]])) {
+                return false;
+            }
+        }
+    }
+    return true;
+}
 
-    log()->info("for a set of size {:d} with a chain cover of size {:d} antichain of size {:d} is found", ss.size(), ss.size() - num_edges, result.size());
+// By Dilworth's theorem a chain cover with pairwise incomparable tails is minimal,
+// in this case the matching is not needed at all
+template<size_t W>
+auto construct_dilworths_mates(vector<Support<W>> const& ss, Stats* stats) {
+    vector<int> mate{};
+    {
+        PhaseTimer const timer{stats, "greedy"};
+        mate = find_greedy_mates(ss);
+        if (is_antichain(chain_tails(mate), ss)) {
+            count(stats, "greedy_certified", 1);
+            return mate;
+        }
+    }
 
-    return result;
-}
+    BipartiteGraph g{};
+    {
+        PhaseTimer const timer{stats, "graph_build"};
+        g = construct_dilworths_graph(ss);
+    }
+    count(stats, "edges", g.targets.size());
 
-auto calc_memory_increase(size_t s1_idx, size_t s2_idx, vector<Support> const& ss, vector<int> const& weights) {
-    auto const res = get_union(ss[s1_idx], ss[s2_idx]);
-    return ((long long) weights[s1_idx]) * ((1ll << (res.size() - ss[s1_idx].size())) - 1)
-        + ((long long) weights[s2_idx]) * ((1ll << (res.size() - ss[s2_idx].size())) - 1);
+    PhaseTimer const timer{stats, "matching"};
+    return max_bipartite_matching(g, ss.size(), mate);
 }
 
-struct AntichainReductionResult {
-    AntichainReductionResult(int s1_idx, int s2_idx, int md) 
-        : s1_idx{s1_idx}, s2_idx{s2_idx}, md{md} {}
-    int const s1_idx;
-    int const s2_idx;
-    int const md;
+// Large enough to exceed any memory budget, small enough to be summed up without overflow
+auto constexpr INFEASIBLE_MEMORY_INCREASE = 1ll << 61;
+
+template<size_t W>
+auto calc_memory_increase(Support<W> const& s1, Support<W> const& s2, int w1, int w2) -> long long {
+    auto const res = get_union(s1, s2);
+    auto const increase = [&res](Support<W> const& s, long long w) {
+        auto const extra = res.size() - s.size();
+        return extra <= 30 ? w * ((1ll << extra) - 1) : INFEASIBLE_MEMORY_INCREASE;
+    };
+    return std::min(increase(s1, w1) + increase(s2, w2), INFEASIBLE_MEMORY_INCREASE);
+}
 
-    auto is_valid() {
-        return s1_idx != -1;
+// The cheapest partner of an element x of the maximum antichain: either another element of it
+// or a proper superset of x
+template<size_t W>
+struct MergeOption {
+    Support<W> y;
+    long long md = -1;
+    int y_stamp = 0; // generation of y if it is in the antichain, its version otherwise
+    bool y_in_antichain = false;
+
+    auto is_valid() const {
+        return md != -1;
     }
 };
 
-auto try_reduce_antichain(vector<size_t> const& ac, vector<Support> const& ss, vector<int> const& weights, int max_md) -> AntichainReductionResult  {
-    auto first_succeded = false; 
-    auto s1_idx_opt = -1; 
-    auto s2_idx_opt = -1;
-    auto md_opt = -1;
+// An option of x in the queue, outdated once the stamp of x changes
+template<size_t W>
+struct MergeCandidate {
+    long long md;
+    int set;
+    Support<W> x;
+    int stamp;
+};
+
+template<size_t W>
+auto operator>(MergeCandidate<W> const& lhs, MergeCandidate<W> const& rhs) {
+    return std::tie(lhs.md, lhs.set, lhs.x) > std::tie(rhs.md, rhs.set, rhs.x);
+}
 
-    for (auto const sac_idx : ac) {
+// A set of supports under expansion. Merges are taken from the maximum antichain, which is read off
+// the matching of the chain partition; the matching is repaired after each merge instead of being
+// recomputed, and a merge is undone if the number of chains grows, so that it never grows
+// with the memory budget. Every element of the antichain keeps its cheapest partner: supports that
+// enter the antichain are offered to the other elements, and an element rescans the antichain only
+// when its partner has left it or has been merged away. The preimages of the current supports
+// are kept in a disjoint-set forest.
+template<size_t W>
+class Expansion {
+public:
+    Expansion(vector<Support<W>> const& ss, vector<int> const& weights)
+        : partition_{select_unique(ss)} {
         for (auto i = 0u; i < ss.size(); i++) {
-            if (is_subset(ss[sac_idx], ss[i]) && ss[sac_idx] != ss[i]) {
-                first_succeded = true;
-
-                auto const md = calc_memory_increase(sac_idx, i, ss, weights);
-                log()->info("trying to merge {} with {}, memory increase is {:d}", ss[sac_idx], ss[i], md);
-                if (md <= max_md && (s1_idx_opt == -1 || md_opt > md)) {
-                    s1_idx_opt = sac_idx;
-                    s2_idx_opt = i;
-                    md_opt = md;
-                }
+            if (!roots_.count(ss[i])) {
+                roots_[ss[i]] = preimages_.size();
+                preimages_.emplace_back(ss[i]);
+                parent_.emplace_back(parent_.size());
+                image_.emplace_back(ss[i]);
             }
+            weights_[ss[i]] += weights[i];
         }
     }
 
-    if (first_succeded) {
-       return AntichainReductionResult(s1_idx_opt, s2_idx_opt, md_opt);
+    // Passes the options of the initial antichain to push
+    template<class F>
+    void start(F push) {
+        update_antichain(nullptr, push);
     }
-    
 
-    for (auto s1_idx : ac) {
-        for (auto s2_idx : ac) {
-            if (s1_idx != s2_idx) {
-                auto const md = calc_memory_increase(s1_idx, s2_idx, ss, weights);
-                log()->info("trying to merge {:d} with {:d}, memory increase is {:d}", s1_idx, s2_idx, md);
-                if (md <= max_md && (s1_idx_opt == -1 || md_opt > md)) {
-                    s1_idx_opt = s1_idx;
-                    s2_idx_opt = s2_idx;
-                    md_opt = md;
-                }
+    auto is_current(MergeCandidate<W> const& c) const {
+        return antichain_.count(c.x) && stamps_.at(c.x) == c.stamp;
+    }
+
+    auto is_outdated(Support<W> const& x) const {
+        auto const& option = options_.at(x);
+        if (!weights_.count(option.y)) {
+            return true;
+        }
+        if (option.y_in_antichain) {
+            return !antichain_.count(option.y) || gens_.at(option.y) != option.y_stamp;
+        }
+        return versions_.at(option.y) != option.y_stamp;
+    }
+
+    // Finds the cheapest partner of x anew
+    auto rescan(Support<W> const& x) -> MergeCandidate<W> {
+        auto const wx = weights_.at(x);
+        auto& option = options_[x];
+        option = MergeOption<W>{};
+        for (auto const& y : elements_) {
+            if (std::get<0>(y) != x) {
+                offer(&option, x, wx, std::get<0>(y), std::get<1>(y), true);
             }
         }
+        for (auto const& y : partition_.supersets(x)) {
+            offer(&option, x, wx, y, weights_.at(y), false);
+        }
+        return candidate(x);
     }
 
-    return AntichainReductionResult(s1_idx_opt, s2_idx_opt, md_opt);
-}
+    // Merges x with its partner unless it increases the number of chains,
+    // new options are passed to push
+    template<class F>
+    auto merge(MergeCandidate<W> const& c, F push) -> bool {
+        auto const x = c.x;
+        auto const y = options_.at(x).y;
+        auto const md = options_.at(x).md;
+        auto const new_s = get_union(x, y);
+        auto const is_new = !weights_.count(new_s);
+        auto const num_chains = partition_.num_groups();
+
+        partition_.remove(x);
+        if (y != new_s) {
+            partition_.remove(y);
+        }
+        if (is_new) {
+            partition_.add(new_s);
+        }
 
+        if (partition_.num_groups() > num_chains) {
+            log()->debug("merging {} with {} increases the number of chains", x, y);
+            if (is_new) {
+                partition_.remove(new_s);
+            }
+            partition_.add(x);
+            if (y != new_s) {
+                partition_.add(y);
+            }
+            rejected_[x].emplace_back(y);
+            push(rescan(x));
+            return false;
+        }
 
-auto get_preimage(support_map<Support> const& map, Support const& elem) -> vector<Support> {
-    vector<Support> result{};
-    for (auto const& ss : map) {
-        if (ss.second == elem) {
-            result.emplace_back(ss.first);
+        log()->debug("expanding {} and {}, the old size is {:d}", x, y, weights_.size());
+
+        auto new_w = weights_.at(x) + weights_.at(y) + int(md);
+        auto root = unite(roots_.at(x), roots_.at(y));
+        if (!is_new && new_s != y) {
+            new_w += weights_.at(new_s);
+            root = unite(root, roots_.at(new_s));
+        }
+        for (auto const& s : {x, y}) {
+            if (s != new_s) {
+                weights_.erase(s);
+                roots_.erase(s);
+                versions_[s]++;
+            }
         }
+        weights_[new_s] = new_w;
+        roots_[new_s] = root;
+        image_[root] = new_s;
+        versions_[new_s]++;
+
+        log()->debug("stop expanding, the new size is {:d}", weights_.size());
+
+        update_antichain(&new_s, push);
+        return true;
     }
-    return result;
-}
 
-auto expand(size_t s1_idx, size_t s2_idx, vector<Support> &ss, vector<int> &weights, support_map<Support> &expansions) {
-    if (s2_idx < s1_idx) {
-        swap(s1_idx, s2_idx);
+    auto supports() const {
+        return partition_.supports();
     }
 
-    auto const s1_preimage = get_preimage(expansions, ss[s1_idx]);
-    auto const s2_preimage = get_preimage(expansions, ss[s2_idx]);
-    auto const new_s = get_union(ss[s1_idx], ss[s2_idx]);
-    auto const md = calc_memory_increase(s1_idx, s2_idx, ss, weights);
-    auto const new_w = weights[s2_idx] + weights[s1_idx] + md;
+    auto expansions() {
+        support_map<W, Support<W>> result{};
+        for (auto i = 0u; i < preimages_.size(); i++) {
+            result[preimages_[i]] = image_[find(i)];
+        }
+        return result;
+    }
+
+private:
+    // Takes the antichain of the current matching. The supports that have entered it (or changed,
+    // if in it) rescan it, the rest are offered the entered supports and the changed one, if it
+    // is their superset.
+    template<class F>
+    void update_antichain(Support<W> const* changed, F push) {
+        epoch_++;
+        elements_.clear();
+        vector<std::pair<Support<W>, int>> entered{};
+        for (auto const& s : partition_.max_antichain()) {
+            auto& element = antichain_[s];
+            auto const is_entered = element.epoch != epoch_ - 1 || (changed != nullptr && s == *changed);
+            element = AntichainElement{weights_.at(s), is_entered, epoch_};
+            elements_.emplace_back(s, element.weight, is_entered);
+            if (is_entered) {
+                gens_[s]++;
+                rejected_.erase(s);
+                entered.emplace_back(s, element.weight);
+            }
+        }
+        for (auto it = begin(antichain_); it != end(antichain_);) {
+            it = it->second.epoch == epoch_ ? next(it) : antichain_.erase(it);
+        }
+
+        for (auto const& x : entered) {
+            push(rescan(x.first));
+        }
 
-    log()->info("expanding set #{:d} and set #{:d}, the old size is {:d}", s1_idx, s2_idx, ss.size());
+        for (auto const& x : elements_) {
+            if (std::get<2>(x)) {
+                continue;
+            }
+            auto& option = options_.at(std::get<0>(x));
+            auto improved = false;
+            for (auto const& y : entered) {
+                improved |= offer(&option, std::get<0>(x), std::get<1>(x), y.first, y.second, true);
+            }
+            if (improved) {
+                push(candidate(std::get<0>(x)));
+            }
+        }
+        if (changed != nullptr) {
+            for (auto const& x : partition_.subsets(*changed)) {
+                auto const it = antichain_.find(x);
+                if (it != end(antichain_) && !it->second.is_entered
+                        && offer(&options_.at(x), x, it->second.weight, *changed, weights_.at(*changed), false)) {
+                    push(candidate(x));
+                }
+            }
+        }
+    }
 
-    ss.erase(begin(ss) + s2_idx);
-    weights.erase(begin(weights) + s2_idx);
-    ss.erase(begin(ss) + s1_idx);
-    weights.erase(begin(weights) + s1_idx);
+    // Makes y the partner of x if it is cheaper than the current one, ties are broken by the order of supports
+    auto offer(MergeOption<W>* option, Support<W> const& x, int wx, Support<W> const& y, int wy, bool y_in_antichain) -> bool {
+        auto const md = calc_memory_increase(x, y, wx, wy);
+        if (md >= INFEASIBLE_MEMORY_INCREASE || (option->is_valid() && std::tie(option->md, option->y) <= std::tie(md, y))) {
+            return false;
+        }
+        auto const rejected = rejected_.find(x);
+        if (rejected != end(rejected_) && std::find(begin(rejected->second), end(rejected->second), y) != end(rejected->second)) {
+            return false;
+        }
+        *option = MergeOption<W>{y, md, y_in_antichain ? gens_.at(y) : versions_[y], y_in_antichain};
+        return true;
+    }
 
-    ss.emplace_back(new_s);
-    weights.emplace_back(new_w);
+    auto candidate(Support<W> const& x) -> MergeCandidate<W> {
+        return MergeCandidate<W>{options_.at(x).md, 0, x, ++stamps_[x]};
+    }
 
-    for (auto const s : s1_preimage) {
-        expansions[s] = new_s;
+    auto find(int x) -> int {
+        while (parent_[x] != x) {
+            x = parent_[x] = parent_[parent_[x]];
+        }
+        return x;
     }
-    for (auto const s : s2_preimage) {
-        expansions[s] = new_s;
+
+    auto unite(int x, int y) -> int {
+        x = find(x);
+        y = find(y);
+        parent_[y] = x;
+        return x;
     }
 
-    log()->info("stop expanding, the new size is {:d}", ss.size());
+    ChainPartition<W> partition_;
+    support_map<W, int> weights_;
+    support_map<W, int> roots_; // current support -> root of its preimage
+
+    struct AntichainElement {
+        int weight = 0;
+        bool is_entered = false; // by the last update
+        int epoch = -1; // of the last update that has found it in the antichain
+    };
+
+    support_map<W, AntichainElement> antichain_;
+    vector<std::tuple<Support<W>, int, bool>> elements_; // support, weight and whether it is entered
+    int epoch_ = 0;
+    support_map<W, MergeOption<W>> options_;
+    support_map<W, vector<Support<W>>> rejected_; // partners that would increase the number of chains
+    support_map<W, int> stamps_; // changes whenever the option of a support changes
+    support_map<W, int> gens_; // changes whenever a support enters the antichain or is merged into
+    support_map<W, int> versions_; // changes whenever the weight of a support changes or it is removed
+
+    vector<Support<W>> preimages_;
+    vector<int> parent_;
+    vector<Support<W>> image_; // current support of each root
+};
 
-    return md;
 }
 
-}
+template<size_t W>
+auto p4t::find_min_chain_partition(vector<Support<W>> const& ss, Stats* stats) -> vector<vector<Support<W>>> {
+    count(stats, "vertices", ss.size());
+    auto const mate = construct_dilworths_mates(ss, stats);
 
-auto p4t::find_min_chain_partition(vector<Support> const& ss) -> vector<vector<Support>> {
-    auto const mate = construct_dilworths_mates(ss);
-    return calculate_chains(ss, mate, graph_traits<MaxMatchingGraph>::null_vertex());
+    PhaseTimer const timer{stats, "chain_extraction"};
+    return calculate_chains(ss, mate);
 }
 
 
+template<size_t W>
 auto p4t::find_min_bounded_chain_partition(
-        vector<vector<Support>> const& sss, 
+        vector<vector<Support<W>>> const& sss, 
         vector<vector<int>> const& weights, 
-        int max_num_chains) -> vector<vector<vector<Support>>> {
-    using namespace boost;
-    
-    using std::begin; // confilcts with boost
-    using std::end; // conflicts with boost
-    using VD = graph_traits<MinCostMaxFlowGraph>::vertex_descriptor;
-
-    vector<int> ss_offset{};
-    auto total_size = 0;
-    for (auto const& ss : sss) {
-        ss_offset.emplace_back(total_size);
-        total_size += ss.size();
-    }
-
-    MinCostMaxFlowGraph g(2 * total_size + 3); // source, aux_source, target
-    auto const source = 2 * total_size;
-    auto const aux_source = 2 * total_size + 1;
-    auto const target = 2 * total_size + 2;
-
-    auto capacity = get(edge_capacity, g);
-    auto rev = get(edge_reverse, g);
-    auto weight = get(edge_weight, g);
-
-    auto add_edge = [&capacity, &rev, &weight, &g]
-        (VD u, VD v, int c, int w) {
-            auto e = boost::add_edge(u, v, g).first;
-            auto er = boost::add_edge(v, u, g).first;
-            rev[e] = er;
-            rev[er] = e;
-
-            capacity[e] = c;
-            capacity[er] = 0;
-            weight[e] = w;
-            weight[er] = -w;
-        };
+        int max_num_chains,
+        Stats* stats) -> vector<vector<vector<Support<W>>>> {
+    // Graphs and warm-start matchings of different sets are independent
+    vector<BipartiteGraph> ss_gs(sss.size());
+    vector<vector<int>> ss_mates(sss.size());
+    #pragma omp parallel for schedule(dynamic)
+    for (auto ss_idx = 0; ss_idx < int(sss.size()); ss_idx++) {
+        {
+            PhaseTimer const timer{stats, "graph_build"};
+            ss_gs[ss_idx] = construct_dilworths_graph(sss[ss_idx]);
+        }
+        PhaseTimer const timer{stats, "matching"};
+        ss_mates[ss_idx] = max_bipartite_matching(ss_gs[ss_idx], ss_gs[ss_idx].num_left(), find_greedy_mates(sss[ss_idx]));
+    }
 
+    // All sets share a single graph, so that the bound on the number of chains is joint
+    BipartiteGraph g{};
+    g.offsets.emplace_back(0);
+    vector<int> all_weights{};
+    vector<int> mate{};
+    vector<int> offsets{};
+    for (auto ss_idx = 0u; ss_idx < sss.size(); ss_idx++) {
+        auto const offset = int(mate.size());
+        offsets.emplace_back(offset);
+        auto const& ss_g = ss_gs[ss_idx];
+        for (auto i = 0; i < ss_g.num_left(); i++) {
+            g.offsets.emplace_back(g.offsets.back() + ss_g.offsets[i + 1] - ss_g.offsets[i]);
+        }
+        for (auto const j : ss_g.targets) {
+            g.targets.emplace_back(offset + j);
+        }
+        for (auto const j : ss_mates[ss_idx]) {
+            mate.emplace_back(j != NO_MATE ? offset + j : NO_MATE);
+        }
+        all_weights.insert(end(all_weights), begin(weights[ss_idx]), end(weights[ss_idx]));
+    }
+
+    count(stats, "vertices", g.num_left());
+    count(stats, "edges", g.targets.size());
+
+    {
+        PhaseTimer const timer{stats, "flow"};
+        mate = min_cost_bounded_matching(g, all_weights, mate, std::max(0, g.num_left() - max_num_chains));
+    }
 
+    vector<vector<vector<Support<W>>>> result(sss.size());
+    #pragma omp parallel for schedule(dynamic)
     for (auto ss_idx = 0; ss_idx < int(sss.size()); ss_idx++) {
+        PhaseTimer const timer{stats, "chain_extraction"};
         auto const& ss = sss[ss_idx];
-        auto const offset = ss_offset[ss_idx];
+        auto const offset = offsets[ss_idx];
+        vector<int> ss_mate{};
+        for (auto i = 0u; i < ss.size(); i++) {
+            ss_mate.emplace_back(mate[offset + i] != NO_MATE ? mate[offset + i] - offset : NO_MATE);
+        }
+        result[ss_idx] = calculate_chains(ss, ss_mate);
+    }
 
-        for (VD i = 0; i < ss.size(); i++) {
-            for (VD j = 0; j < ss.size(); j++) {
-                if (is_subset(ss[i], ss[j]) && ss[i] != ss[j]) {
-                    add_edge(offset + i, total_size + offset + j, 1, 0);
-                }
+    return result;
+}
+
+
+template<size_t W>
+auto p4t::find_min_chain_partition_w_expansion(
+        vector<vector<Support<W>>> const& init_sss, 
+        vector<vector<int>> const& init_weights,
+        int max_memory,
+        Stats* stats) -> pair<vector<vector<Support<W>>>, vector<support_map<W, Support<W>>>> {
+    PhaseTimer const timer{stats, "expansion"};
+
+    auto current_memory = 0ll;
+    for (auto const& w : init_weights) {
+        current_memory += accumulate(std::begin(w), std::end(w), 0ll);
+    }
+
+    vector<std::unique_ptr<Expansion<W>>> expansions(init_sss.size());
+    vector<vector<MergeCandidate<W>>> initial_candidates(init_sss.size());
+    #pragma omp parallel for schedule(dynamic)
+    for (auto i = 0; i < int(init_sss.size()); i++) {
+        expansions[i] = std::make_unique<Expansion<W>>(init_sss[i], init_weights[i]);
+        expansions[i]->start([&initial_candidates, i](MergeCandidate<W> c) {
+            if (c.md != -1) {
+                c.set = i;
+                initial_candidates[i].emplace_back(c);
             }
+        });
+    }
 
-            add_edge(offset + i, total_size + offset + i, 1, weights[ss_idx][i]);
+    // Options of all the sets keyed by their memory increase. The ones that have been replaced
+    // are skipped, the ones whose partner has gone are rescanned and pushed back.
+    std::priority_queue<MergeCandidate<W>, vector<MergeCandidate<W>>, std::greater<>> candidates{};
+    for (auto const& cs : initial_candidates) {
+        for (auto const& c : cs) {
+            candidates.emplace(c);
         }
+    }
 
+    while (!candidates.empty()) {
+        auto const candidate = candidates.top();
+        candidates.pop();
+
+        auto& expansion = *expansions[candidate.set];
+        auto const push = [&candidates, &candidate](MergeCandidate<W> c) {
+            if (c.md != -1) {
+                c.set = candidate.set;
+                candidates.emplace(c);
+            }
+        };
+        if (!expansion.is_current(candidate)) {
+            continue;
+        }
+        if (expansion.is_outdated(candidate.x)) {
+            count(stats, "expansion_rescans", 1);
+            push(expansion.rescan(candidate.x));
+            continue;
+        }
+        if (candidate.md > max_memory - current_memory) {
+            break;
+        }
+
+        if (!expansion.merge(candidate, push)) {
+            count(stats, "expansion_rejected", 1);
+            continue;
+        }
+        current_memory += candidate.md;
+        count(stats, "expansion_iterations", 1);
+        count(stats, "memory_added", candidate.md);
     }
 
-    for (VD i = 0; int(i) < total_size; i++) {
-        add_edge(aux_source, i, 1, 0);
-        add_edge(total_size + i, target, 1, 0);
+    vector<vector<Support<W>>> sss{};
+    vector<support_map<W, Support<W>>> result{};
+    for (auto& expansion : expansions) {
+        sss.emplace_back(expansion->supports());
+        result.emplace_back(expansion->expansions());
     }
 
-    add_edge(source, aux_source, std::max(0, total_size - max_num_chains), 0);
+    return make_pair(sss, result);
+}
 
-    successive_shortest_path_nonnegative_weights(g, source, target);
 
-    auto res_capacity = get(edge_residual_capacity, g);
+namespace {
 
-    vector<vector<vector<Support>>> result{};
-    for (auto ss_idx = 0; ss_idx < int(sss.size()); ss_idx++) {
-        auto const& ss = sss[ss_idx];
-        auto const offset = ss_offset[ss_idx];
+void erase_unordered(vector<int>& xs, int x) {
+    auto const it = find(begin(xs), end(xs), x);
+    assert(it != end(xs));
+    *it = xs.back();
+    xs.pop_back();
+}
+
+}
+
+template<size_t W>
+p4t::ChainPartition<W>::ChainPartition(vector<Support<W>> const& supports) {
+    for (auto const& s : supports) {
+        if (ids_.count(s)) {
+            counts_[ids_[s]]++;
+        } else {
+            allocate(s);
+        }
+    }
+
+    auto const g = construct_dilworths_graph(supports_);
+    for (auto u = 0; u < g.num_left(); u++) {
+        for (auto e = g.offsets[u]; e < g.offsets[u + 1]; e++) {
+            subsets_[u].emplace_back(g.targets[e]);
+            supersets_[g.targets[e]].emplace_back(u);
+        }
+    }
+
+    mate_left_ = find_greedy_mates(supports_);
+    if (!is_antichain(chain_tails(mate_left_), supports_)) {
+        mate_left_ = max_bipartite_matching(g, supports_.size(), mate_left_);
+    }
+    for (auto u = 0u; u < mate_left_.size(); u++) {
+        if (mate_left_[u] != NO_MATE) {
+            mate_right_[mate_left_[u]] = u;
+        }
+    }
+
+    vector<int> all(supports_.size());
+    std::iota(std::begin(all), std::end(all), 0);
+    update_groups(all);
+}
 
-        vector<VD> mate(ss.size() * 2, graph_traits<MinCostMaxFlowGraph>::null_vertex());
+template<size_t W>
+auto p4t::ChainPartition<W>::allocate(Support<W> const& s) -> int {
+    auto id = int(supports_.size());
+    if (!free_ids_.empty()) {
+        id = free_ids_.back();
+        free_ids_.pop_back();
+        supports_[id] = s;
+    } else {
+        supports_.emplace_back(s);
+        counts_.emplace_back();
+        subsets_.emplace_back();
+        supersets_.emplace_back();
+        mate_left_.emplace_back(NO_MATE);
+        mate_right_.emplace_back(NO_MATE);
+        group_.emplace_back(NO_GROUP);
+        seen_from_.emplace_back(0);
+        seen_to_.emplace_back(0);
+        parent_.emplace_back(NO_MATE);
+    }
+    counts_[id] = 1;
+    ids_[s] = id;
+    return id;
+}
 
-        for (VD i = 0; i < ss.size(); i++) {
-            for (VD j = 0; j < ss.size(); j++) {
-                auto edge_ok = edge(offset + i, total_size + offset + j, g);
-                if (edge_ok.second && res_capacity[edge_ok.first] == 0) {
-                    mate[i] = j + ss.size();
-                    mate[j + ss.size()] = i;
+// BFS for an augmenting path from the free vertex root, the same code serves both sides of the graph
+template<size_t W>
+auto p4t::ChainPartition<W>::augment(int root, vector<vector<int>> const& adj, 
+        vector<int>& mate_from, vector<int>& mate_to, vector<int>& touched) -> bool {
+    stamp_++;
+    vector<int> queue{root};
+    seen_from_[root] = stamp_;
+
+    for (auto k = 0u; k < queue.size(); k++) {
+        for (auto y : adj[queue[k]]) {
+            if (seen_to_[y] == stamp_) {
+                continue;
+            }
+            seen_to_[y] = stamp_;
+            parent_[y] = queue[k];
+
+            if (mate_to[y] == NO_MATE) {
+                while (y != NO_MATE) {
+                    auto const x = parent_[y];
+                    auto const next = mate_from[x];
+                    mate_from[x] = y;
+                    mate_to[y] = x;
+                    touched.emplace_back(x);
+                    touched.emplace_back(y);
+                    y = next;
                 }
+                return true;
             }
-        }
 
-        result.emplace_back(calculate_chains(ss, mate, graph_traits<MinCostMaxFlowGraph>::null_vertex()));
+            auto const z = mate_to[y];
+            if (seen_from_[z] != stamp_) {
+                seen_from_[z] = stamp_;
+                queue.emplace_back(z);
+            }
+        }
     }
 
-    return result;
+    return false;
 }
 
+template<size_t W>
+auto p4t::ChainPartition<W>::add(Support<W> const& s) -> ChainPartitionDelta<W> {
+    if (ids_.count(s)) {
+        counts_[ids_[s]]++;
+        return ChainPartitionDelta<W>{};
+    }
 
-auto p4t::find_min_chain_partition_w_expansion(
-        vector<vector<Support>> const& init_sss,
-        vector<vector<int>> const& init_weights,
-        int max_memory) -> pair<vector<vector<Support>>, vector<support_map<Support>>> {
-    auto sss = init_sss;
-    auto weights = init_weights;
+    auto const v = allocate(s);
+    vector<int> touched{v};
 
-    auto current_memory = 0;
-    for (auto const& w : weights) {
-        current_memory += accumulate(std::begin(w), std::end(w), 0);
+    // The left copy goes first, so that a single augmenting path search after each step keeps the matching maximum
+    for (auto u = 0u; u < supports_.size(); u++) {
+        if (counts_[u] > 0 && is_proper_subset(supports_[u], supports_[v])) {
+            subsets_[v].emplace_back(u);
+            supersets_[u].emplace_back(v);
+        }
     }
+    augment(v, subsets_, mate_left_, mate_right_, touched);
 
-    vector<support_map<Support>> expansions{};
-    for (auto const& ss : sss) {
-        expansions.emplace_back();
-        for (auto const& s : ss) {
-            expansions.back()[s] = s;
+    for (auto u = 0u; u < supports_.size(); u++) {
+        if (counts_[u] > 0 && is_proper_subset(supports_[v], supports_[u])) {
+            supersets_[v].emplace_back(u);
+            subsets_[u].emplace_back(v);
         }
     }
+    augment(v, supersets_, mate_right_, mate_left_, touched);
+
+    auto delta = update_groups(touched);
+    delta.moved.emplace_back(s, NO_GROUP, group_[v]);
+    return delta;
+}
+
+template<size_t W>
+auto p4t::ChainPartition<W>::remove(Support<W> const& s) -> ChainPartitionDelta<W> {
+    if (!ids_.count(s)) {
+        throw std::invalid_argument("support is not in the partition");
+    }
+    auto const v = ids_[s];
+    if (--counts_[v] > 0) {
+        return ChainPartitionDelta<W>{};
+    }
+    vector<int> touched{v};
+
+    // The right copy goes first, the freed predecessor is the only possible start of an augmenting path
+    for (auto u : supersets_[v]) {
+        erase_unordered(subsets_[u], v);
+    }
+    supersets_[v].clear();
+    auto const p = mate_right_[v];
+    if (p != NO_MATE) {
+        mate_left_[p] = mate_right_[v] = NO_MATE;
+        touched.emplace_back(p);
+        augment(p, subsets_, mate_left_, mate_right_, touched);
+    }
+
+    for (auto w : subsets_[v]) {
+        erase_unordered(supersets_[w], v);
+    }
+    subsets_[v].clear();
+    auto const q = mate_left_[v];
+    if (q != NO_MATE) {
+        mate_right_[q] = mate_left_[v] = NO_MATE;
+        touched.emplace_back(q);
+        augment(q, supersets_, mate_right_, mate_left_, touched);
+    }
 
-    while (true) {
-        vector<AntichainReductionResult> our_options;
+    ids_.erase(s);
+    free_ids_.emplace_back(v);
+
+    auto delta = update_groups(touched);
+    delta.moved.emplace_back(s, group_[v], NO_GROUP);
+    group_[v] = NO_GROUP;
+    return delta;
+}
 
-        for (auto i = 0u; i < sss.size(); i++) {
-            our_options.emplace_back(try_reduce_antichain(find_max_antichain(sss[i]), sss[i], weights[i], max_memory - current_memory));
+template<size_t W>
+auto p4t::ChainPartition<W>::update_groups(vector<int> const& touched) -> ChainPartitionDelta<W> {
+    std::set<int> old_groups{};
+    for (auto x : touched) {
+        if (group_[x] != NO_GROUP) {
+            old_groups.insert(group_[x]);
         }
+    }
 
-        // It should be extracted.. Or is it already?
-        auto best_option = -1;
-        for (auto i = 0u; i < our_options.size(); i++) {
-            if (our_options[i].is_valid() && (best_option == -1 || our_options[i].md < our_options[best_option].md)) {
-                best_option = i;
+    stamp_++;
+    vector<vector<int>> chains{};
+    for (auto x : touched) {
+        if (counts_[x] == 0 || seen_from_[x] == stamp_) {
+            continue;
+        }
+        auto head = x;
+        while (mate_right_[head] != NO_MATE) {
+            head = mate_right_[head];
+        }
+        chains.emplace_back();
+        for (auto y = head; y != NO_MATE; y = mate_left_[y]) {
+            seen_from_[y] = stamp_;
+            chains.back().emplace_back(y);
+        }
+    }
+
+    ChainPartitionDelta<W> delta{};
+    std::set<int> taken{};
+    for (auto const& chain : chains) {
+        // The chain inherits the group that most of its vertices belonged to
+        std::map<int, int> votes{};
+        for (auto y : chain) {
+            if (group_[y] != NO_GROUP && !taken.count(group_[y])) {
+                votes[group_[y]]++;
+            }
+        }
+        auto const best = std::max_element(std::begin(votes), std::end(votes), [](auto const& a, auto const& b) {
+            return a.second < b.second;
+        });
+        auto const group = best != std::end(votes) ? best->first : next_group_++;
+        taken.insert(group);
+
+        if (!members_.count(group) || members_[group] != chain) {
+            delta.groups[group] = chain_supports(chain);
+        }
+        for (auto y : chain) {
+            if (group_[y] != group) {
+                if (group_[y] != NO_GROUP) {
+                    delta.moved.emplace_back(supports_[y], group_[y], group);
+                }
+                group_[y] = group;
             }
         }
+        members_[group] = chain;
+    }
 
-        if (best_option == -1) {
-            break;
-        } 
+    for (auto group : old_groups) {
+        if (!taken.count(group)) {
+            members_.erase(group);
+            delta.removed.emplace_back(group);
+        }
+    }
+
+    return delta;
+}
 
-        current_memory += expand(our_options[best_option].s1_idx, our_options[best_option].s2_idx, sss[best_option], weights[best_option], expansions[best_option]);
+template<size_t W>
+auto p4t::ChainPartition<W>::chain_supports(vector<int> const& chain) const -> vector<Support<W>> {
+    vector<Support<W>> result{};
+    for (auto y : chain) {
+        result.emplace_back(supports_[y]);
     }
+    return result;
+}
 
-    return make_pair(sss, expansions);
+template<size_t W>
+auto p4t::ChainPartition<W>::group_of(Support<W> const& s) const -> int {
+    if (!ids_.count(s)) {
+        throw std::invalid_argument("support is not in the partition");
+    }
+    return group_[ids_.at(s)];
 }
+
+template<size_t W>
+auto p4t::ChainPartition<W>::groups() const -> std::map<int, vector<Support<W>>> {
+    std::map<int, vector<Support<W>>> result{};
+    for (auto const& group_n_chain : members_) {
+        result[group_n_chain.first] = chain_supports(group_n_chain.second);
+    }
+    return result;
+}
+
+template<size_t W>
+auto p4t::ChainPartition<W>::supports() const -> vector<Support<W>> {
+    vector<Support<W>> result{};
+    for (auto u = 0u; u < supports_.size(); u++) {
+        if (counts_[u] > 0) {
+            result.emplace_back(supports_[u]);
+        }
+    }
+    return result;
+}
+
+template<size_t W>
+auto p4t::ChainPartition<W>::subsets(Support<W> const& s) const -> vector<Support<W>> {
+    vector<Support<W>> result{};
+    for (auto v : subsets_[ids_.at(s)]) {
+        result.emplace_back(supports_[v]);
+    }
+    return result;
+}
+
+template<size_t W>
+auto p4t::ChainPartition<W>::supersets(Support<W> const& s) const -> vector<Support<W>> {
+    vector<Support<W>> result{};
+    for (auto u : supersets_[ids_.at(s)]) {
+        result.emplace_back(supports_[u]);
+    }
+    return result;
+}
+
+// Koenig's construction on the maintained matching, which is maximum after every update
+template<size_t W>
+auto p4t::ChainPartition<W>::max_antichain() const -> vector<Support<W>> {
+    vector<bool> left_reached(supports_.size(), false);
+    vector<bool> right_reached(supports_.size(), false);
+    vector<int> queue{};
+    for (auto u = 0u; u < supports_.size(); u++) {
+        if (counts_[u] > 0 && mate_left_[u] == NO_MATE) {
+            left_reached[u] = true;
+            queue.emplace_back(u);
+        }
+    }
+    for (auto k = 0u; k < queue.size(); k++) {
+        auto const u = queue[k];
+        for (auto v : subsets_[u]) {
+            if (v == mate_left_[u] || right_reached[v]) {
+                continue;
+            }
+            right_reached[v] = true;
+            if (mate_right_[v] != NO_MATE && !left_reached[mate_right_[v]]) {
+                left_reached[mate_right_[v]] = true;
+                queue.emplace_back(mate_right_[v]);
+            }
+        }
+    }
+
+    vector<Support<W>> result{};
+    for (auto u = 0u; u < supports_.size(); u++) {
+        if (left_reached[u] && !right_reached[u]) {
+            result.emplace_back(supports_[u]);
+        }
+    }
+    return result;
+}
+
+#define INSTANTIATE(W) \
+    template auto p4t::find_min_chain_partition<W>(vector<Support<W>> const&, Stats*) -> vector<vector<Support<W>>>; \
+    template auto p4t::find_min_bounded_chain_partition<W>( \
+        vector<vector<Support<W>>> const&, vector<vector<int>> const&, int, Stats*) -> vector<vector<vector<Support<W>>>>; \
+    template auto p4t::find_min_chain_partition_w_expansion<W>( \
+        vector<vector<Support<W>>> const&, vector<vector<int>> const&, int, Stats*) \
+        -> pair<vector<vector<Support<W>>>, vector<support_map<W, Support<W>>>>; \
+    template class p4t::ChainPartition<W>;
+P4T_FOR_EACH_WIDTH(INSTANTIATE)
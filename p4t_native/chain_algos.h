@@ -1,19 +1,87 @@
 #ifndef CHAIN_ALGOS_H
 #define CHAIN_ALGOS_H
 
+#include <map>
+
+#include "stats.h"
 #include "support.h"
 
 namespace p4t {
 
-auto find_min_chain_partition(vector<Support> const& ss) -> vector<vector<Support>>;
+template<size_t W>
+auto find_min_chain_partition(vector<Support<W>> const& ss, Stats* stats = nullptr) -> vector<vector<Support<W>>>;
+template<size_t W>
 auto find_min_bounded_chain_partition(
-        vector<vector<Support>> const& sss, 
+        vector<vector<Support<W>>> const& sss, 
         vector<vector<int>> const& weights, 
-        int max_num_chains) -> vector<vector<vector<Support>>>;
+        int max_num_chains,
+        Stats* stats = nullptr) -> vector<vector<vector<Support<W>>>>;
+template<size_t W>
 auto find_min_chain_partition_w_expansion(
-        vector<vector<Support>> const& sss,
+        vector<vector<Support<W>>> const& sss,
         vector<vector<int>> const& weights,
-        int max_memory) -> pair<vector<vector<Support>>, vector<support_map<Support>>>;
+        int max_memory,
+        Stats* stats = nullptr) -> pair<vector<vector<Support<W>>>, vector<support_map<W, Support<W>>>>;
+
+auto constexpr NO_GROUP = -1;
+
+template<size_t W>
+struct ChainPartitionDelta {
+    std::map<int, vector<Support<W>>> groups; // new contents of created or modified groups
+    vector<int> removed; // groups that no longer exist
+    vector<tuple<Support<W>, int, int>> moved; // support, old group, new group (NO_GROUP if none)
+};
+
+// Minimal chain partition of a multiset of supports that is maintained under additions and removals.
+// Each update changes the underlying maximum matching by at most two augmenting paths,
+// groups keep their ids as long as they keep most of their supports.
+template<size_t W>
+class ChainPartition {
+public:
+    explicit ChainPartition(vector<Support<W>> const& supports);
+
+    auto add(Support<W> const& s) -> ChainPartitionDelta<W>;
+    auto remove(Support<W> const& s) -> ChainPartitionDelta<W>;
+
+    auto group_of(Support<W> const& s) const -> int;
+    auto groups() const -> std::map<int, vector<Support<W>>>;
+
+    auto supports() const -> vector<Support<W>>;
+    auto num_groups() const {
+        return int(members_.size());
+    }
+
+    // Proper subsets and supersets of a support in the partition
+    auto subsets(Support<W> const& s) const -> vector<Support<W>>;
+    auto supersets(Support<W> const& s) const -> vector<Support<W>>;
+
+    auto max_antichain() const -> vector<Support<W>>;
+
+private:
+    auto allocate(Support<W> const& s) -> int;
+    auto augment(int root, vector<vector<int>> const& adj, vector<int>& mate_from, vector<int>& mate_to, vector<int>& touched) -> bool;
+    auto update_groups(vector<int> const& touched) -> ChainPartitionDelta<W>;
+    auto chain_supports(vector<int> const& chain) const -> vector<Support<W>>;
+
+    vector<Support<W>> supports_;
+    vector<int> counts_; // zero for free vertices
+    support_map<W, int> ids_;
+    vector<int> free_ids_;
+
+    vector<vector<int>> subsets_; // left copy of u is adjacent to right copies of subsets_[u]
+    vector<vector<int>> supersets_; // the same edges viewed from the right side
+    vector<int> mate_left_;
+    vector<int> mate_right_;
+
+    vector<int> group_;
+    std::map<int, vector<int>> members_; // chain of vertices of each group, from the largest support
+    int next_group_ = 0;
+
+    vector<int> seen_from_;
+    vector<int> seen_to_;
+    vector<int> parent_;
+    int stamp_ = 0;
+};
 
 }
 
@@ -1,13 +1,70 @@
+#include <atomic>
+#include <chrono>
+
+#include "spdlog/async_logger.h"
+#include "spdlog/sinks/null_sink.h"
+
 #include "common.h"
 
-auto p4t::log() -> std::shared_ptr<spdlog::logger> const& {
-    static auto initialized = false;
-    static std::shared_ptr<spdlog::logger> logger{};
+namespace {
+
+using namespace p4t;
+
+auto constexpr LOGGER_NAME = "p4t_native";
+// Nothing is written to a file unless asked by set_log_sink
+auto constexpr DEFAULT_SINK = "stderr";
+auto constexpr DEFAULT_LEVEL = spdlog::level::warn;
+
+// Messages are formatted by the caller and written by a background thread
+auto constexpr ASYNC_QUEUE_SIZE = 8192;
+auto constexpr FLUSH_INTERVAL = std::chrono::seconds(1);
+
+auto make_sink(string const& sink) -> spdlog::sink_ptr {
+    if (sink == "stdout") {
+        return std::make_shared<spdlog::sinks::stdout_sink_mt>();
+    } else if (sink == "stderr") {
+        return std::make_shared<spdlog::sinks::stderr_sink_mt>();
+    } else if (sink == "null") {
+        return std::make_shared<spdlog::sinks::null_sink_mt>();
+    }
+    return std::make_shared<spdlog::sinks::simple_file_sink_mt>(sink);
+}
+
+auto make_logger(string const& sink, spdlog::level::level_enum level) -> std::shared_ptr<spdlog::logger> {
+    auto result = std::make_shared<spdlog::async_logger>(
+        LOGGER_NAME, make_sink(sink), ASYNC_QUEUE_SIZE, 
+        spdlog::async_overflow_policy::block_retry, nullptr, FLUSH_INTERVAL
+    );
+    result->set_level(level);
+    result->flush_on(spdlog::level::warn);
+    return result;
+}
+
+// Initialization of a local static is thread-safe, the logger is used from parallel regions
+auto logger() -> std::shared_ptr<spdlog::logger>& {
+    static auto result = make_logger(DEFAULT_SINK, DEFAULT_LEVEL);
+    return result;
+}
 
-    if (!initialized) {
-        logger = spdlog::basic_logger_mt("logger", "p4t_native.log");
-        logger->flush_on(spdlog::level::info);
-        initialized = true;
+auto to_level(string const& level) {
+    for (auto i = int(spdlog::level::trace); i <= int(spdlog::level::off); i++) {
+        if (level == spdlog::level::level_names[i]) {
+            return spdlog::level::level_enum(i);
+        }
     }
-    return logger;
+    throw std::invalid_argument("unknown log level: " + level);
+}
+
+}
+
+auto p4t::log() -> std::shared_ptr<spdlog::logger> {
+    return std::atomic_load(&logger());
+}
+
+void p4t::set_log_level(string const& level) {
+    log()->set_level(to_level(level));
+}
+
+void p4t::set_log_sink(string const& sink) {
+    std::atomic_store(&logger(), make_logger(sink, log()->level()));
 }
@@ -7,7 +7,10 @@
 #include <cassert>
 #include <iostream>
 #include <array>
+#include <bitset>
 #include <memory>
+#include <stdexcept>
+#include <type_traits>
 
 #include <boost/python.hpp>
 
@@ -16,8 +19,6 @@
 
 namespace p4t {
 
-auto constexpr MAX_WIDTH = 32 + 32 + 16 + 16 + 8;
-
 namespace py = boost::python;
 
 using std::vector;
@@ -26,9 +27,35 @@ using std::pair;
 using std::string;
 using std::tuple;
 
-using bitarray = std::array<bool, MAX_WIDTH>;
+// Filters are kept in bitsets of a fixed width W, the algorithms are instantiated for each
+// of the widths below and a classifier is handled by the narrowest one that fits its keys
+#define P4T_FOR_EACH_WIDTH(F) F(64) F(128) F(320)
+
+auto constexpr MAX_WIDTH = 320;
+
+template<size_t W>
+using bitarray = std::bitset<W>;
+
+// Calls f(std::integral_constant<size_t, W>{}) for the narrowest W that holds width bits
+template<class F>
+auto dispatch_width(size_t width, F f) {
+    if (width <= 64) {
+        return f(std::integral_constant<size_t, 64>{});
+    } else if (width <= 128) {
+        return f(std::integral_constant<size_t, 128>{});
+    } else if (width <= MAX_WIDTH) {
+        return f(std::integral_constant<size_t, MAX_WIDTH>{});
+    }
+    throw std::invalid_argument("keys wider than " + std::to_string(MAX_WIDTH) + " bits are not supported");
+}
+
+auto log() -> std::shared_ptr<spdlog::logger>;
 
-auto log() -> std::shared_ptr<spdlog::logger> const&;
+// Level is one of trace, debug, info, warning, error, critical and off. Sink is a file
+// name, stdout, stderr or null. Per-pair messages of the algorithms are logged at trace
+// and per-round messages at debug level, the default level is info.
+void set_log_level(string const& level);
+void set_log_sink(string const& sink);
 
 }
 
@@ -12,21 +12,37 @@ enum class Bit {
     ONE, ZERO, ANY 
 };
 
+// A ternary key of at most W bits
+template<size_t W>
 class Filter {
 public:
     Filter() = default;
 
-    Filter(bitarray const& value, bitarray const& mask)
-        : value_(value), mask_(mask), width_(value.size()) {
+    Filter(bitarray<W> const& value, bitarray<W> const& mask)
+        : value_(value & mask), mask_(mask), width_(value.size()) {
     }
 
     Filter(py::object svmr)
         : value_{}, mask_{}, width_{size_t(len(svmr.attr("value")))} {
-        assert(width_ <= value_.size());
+        if (width_ > W) {
+            throw std::invalid_argument("entry is wider than " + std::to_string(W) + " bits");
+        }
 
         for (auto i = 0u; i < width_; i++) {
-            value_[i] = py::extract<bool>(svmr.attr("value")[i]);
             mask_[i] = py::extract<bool>(svmr.attr("mask")[i]);
+            value_[i] = mask_[i] && py::extract<bool>(svmr.attr("value")[i]);
+        }
+    }
+
+    // Bits are packed MSB first: bit i is stored in byte i / 8
+    Filter(uint8_t const* value, uint8_t const* mask, size_t width)
+        : value_{}, mask_{}, width_{width} {
+        assert(width_ <= value_.size());
+
+        for (auto i = 0u; i < width_; i++) {
+            auto const shift = 7 - (i & 7);
+            mask_[i] = (mask[i >> 3] >> shift) & 1;
+            value_[i] = mask_[i] && ((value[i >> 3] >> shift) & 1);
         }
     }
 
@@ -47,24 +63,31 @@ public:
     }
 
 private:
-    bitarray value_;
-    bitarray mask_;
+    bitarray<W> value_;
+    bitarray<W> mask_;
     size_t width_;
 };
 
-template<class Bits>
-inline auto intersect(Filter const& lhs, Filter const& rhs, Bits const& bits) {
-    assert(lhs.size() == rhs.size());
-
+template<size_t W>
+auto to_bitarray(vector<int> const& bits) -> bitarray<W> {
+    bitarray<W> result{};
     for (auto i : bits) {
-        if (rhs.get_mask()[i] && lhs.get_mask()[i] && rhs.get_value()[i] != lhs.get_value()[i]) {
-            return false;
-        }
+        result.set(i);
     }
+    return result;
+}
 
-    return true;
+// Returns the bits among the given ones where both filters are exact and disagree
+template<size_t W>
+auto difference(Filter<W> const& lhs, Filter<W> const& rhs, bitarray<W> const& bits) -> bitarray<W> {
+    assert(lhs.size() == rhs.size());
+    return lhs.get_mask() & rhs.get_mask() & (lhs.get_value() ^ rhs.get_value()) & bits;
 }
 
+template<size_t W>
+auto intersect(Filter<W> const& lhs, Filter<W> const& rhs, bitarray<W> const& bits) {
+    return difference(lhs, rhs, bits).none();
+}
 
 }
 
@@ -1,110 +1,61 @@
+#include <memory>
 #include <numeric>
 #include <functional>
+#include <type_traits>
 #include <parallel/algorithm>
 
 #include "oi_algos.h"
+#include "overlap_index.h"
 
 namespace {
 
 using namespace p4t;
 
-auto is_oi(vector<Filter> const& filters, vector<int> const& bits_in_use) {
-    vector<int> indices(filters.size());    
-    iota(begin(indices), end(indices), 0);
-    vector<bool> has_intersection(filters.size());
-
-    __gnu_parallel::for_each(begin(indices), end(indices),
-        [&filters, &bits_in_use, &has_intersection] (auto i) {
-            for (auto j = 0; j < i; j++) {
-                if (intersect(filters[i], filters[j], bits_in_use)) {
-                    has_intersection[i] = true;
-                    break;
-                }
-            }
-        }
-    );
-
-    return std::find(begin(has_intersection), end(has_intersection), true) == end(has_intersection);
+template<class Index>
+void count_lookups(Stats* stats, Index const& index) {
+    count(stats, "pair_comparisons", index.num_comparisons());
+    count(stats, "hash_probes", index.num_probes());
 }
 
-auto find_blockers(vector<Filter> const& filters, vector<int> const& bits_in_use) {
-    assert(!filters.empty());
-    vector<vector<bool>> blockers(filters.size(), vector<bool>(filters[0].size(), false));
-
-    vector<int> indices(filters.size());    
-    iota(begin(indices), end(indices), 0);
-
-    __gnu_parallel::for_each(begin(indices), end(indices),
-        [&filters, &bits_in_use, &blockers] (auto i) {
-            auto const& lower = filters[i];
-            for (auto j = 0; j < i; j++) {
-                auto const& higher = filters[j];
-
-                auto first_difference = -1;
-                auto only_difference = true;
-                for (auto bit : bits_in_use) {
-                    if (higher[bit] != Bit::ANY && lower[bit] != Bit::ANY && higher[bit] != lower[bit]) {
-                        if (first_difference != -1) {
-                            only_difference = false;
-                            break;
-                        } else {
-                            first_difference = bit;
-                        }
-                    }
-                }
-                if (first_difference == -1) {
-                    for (auto bit : bits_in_use) {
-                        blockers[i][bit] = true;
-                    }
-                    break;
-                } else if (only_difference) {
-                    blockers[i][first_difference] = true;
-                }
-            }
-        }
-    );
-
-    return blockers;
+template<size_t W>
+auto is_oi(vector<Filter<W>> const& filters, vector<int> const& bits_in_use) {
+    return OverlapIndex<W>(filters, bits_in_use).is_oi();
 }
 
+// Candidates are evaluated in parallel, value should be safe to call concurrently
 template<class Function, class Cmp>
 auto find_best_bit(vector<int> const& all_bits, vector<int> const& bits_to_avoid, Function value, Cmp cmp) -> int {
-    auto best_bit = -1;
-    auto best_bit_value = -1;
-
     vector<int> try_first{};
     set_difference(begin(all_bits), end(all_bits), begin(bits_to_avoid), end(bits_to_avoid), back_inserter(try_first));
-    vector<int> try_second{};
-    set_difference(begin(all_bits), end(all_bits), begin(try_first), end(try_first), back_inserter(try_second));
-    
-    for (auto const bit : try_first) {
-        auto const new_value = value(bit);
-        if (best_bit == -1 || cmp(new_value, best_bit_value)) {
-            best_bit = bit;
-            best_bit_value = new_value;
-        }
+
+    auto const& candidates = !try_first.empty() ? try_first : bits_to_avoid;
+
+    vector<std::result_of_t<Function(int)>> values(candidates.size());
+    #pragma omp parallel for schedule(dynamic)
+    for (auto i = 0; i < int(candidates.size()); i++) {
+        values[i] = value(candidates[i]);
     }
 
-    if (best_bit == -1) {
-        for (auto const bit : bits_to_avoid) {
-            auto const new_value = value(bit);
-            if (best_bit == -1 || cmp(new_value, best_bit_value)) {
-                best_bit = bit;
-                best_bit_value = new_value;
-            }
+    auto best_bit = -1;
+    auto best_bit_value = -1;
+    for (auto i = 0u; i < candidates.size(); i++) {
+        if (best_bit == -1 || cmp(values[i], best_bit_value)) {
+            best_bit = candidates[i];
+            best_bit_value = values[i];
         }
     }
 
     return best_bit;
 }
 
-auto remove_bit_w_blockers(vector<Filter> const filters, vector<int> const& bits_in_use, vector<int> const& bits_to_avoid, vector<int> const& bit_num_dontcare, uint l) -> pair<int, vector<int>> {
-    auto const blockers = find_blockers(filters, bits_in_use);
+template<size_t W>
+auto remove_bit_w_blockers(OverlapIndex<W> const& index, vector<int> const& bits_in_use, vector<int> const& bits_to_avoid, vector<int> const& bit_num_dontcare, uint l) -> pair<int, vector<int>> {
+    auto const blockers = index.blockers();
     
-    vector<int> bit_num_blockers(filters[0].size());
+    vector<int> bit_num_blockers(bit_num_dontcare.size());
 
     for (auto const& blocker : blockers) {
-        for (auto i = 0u; i < blocker.size(); i++) {
+        for (auto i = 0u; i < bit_num_blockers.size(); i++) {
             if (blocker[i]) {
                 bit_num_blockers[i]++;
             }
@@ -122,7 +73,7 @@ auto remove_bit_w_blockers(vector<Filter> const filters, vector<int> const& bits
         std::sort(indices_sorted_by_blockers.begin(), indices_sorted_by_blockers.end(), [&bit_num_blockers](int a, int b) {
             return bit_num_blockers[b] > bit_num_blockers[a];
         });
-        log()->info("\t\t\t{:d} {:d} {:d} ... {:d}", bit_num_blockers[ indices_sorted_by_blockers[0] ], bit_num_blockers[ indices_sorted_by_blockers[1] ], bit_num_blockers[ indices_sorted_by_blockers[2] ], bit_num_blockers[ indices_sorted_by_blockers[l] ]);
+        log()->debug("\t\t\t{:d} {:d} {:d} ... {:d}", bit_num_blockers[ indices_sorted_by_blockers[0] ], bit_num_blockers[ indices_sorted_by_blockers[1] ], bit_num_blockers[ indices_sorted_by_blockers[2] ], bit_num_blockers[ indices_sorted_by_blockers[l] ]);
         if ( bit_num_blockers[ indices_sorted_by_blockers[0] ] >= 0.9 * bit_num_blockers[ indices_sorted_by_blockers[2*l] ] ) {
             use_dontcare_heuristic = true;
         }
@@ -144,7 +95,7 @@ auto remove_bit_w_blockers(vector<Filter> const filters, vector<int> const& bits
         }
     }
 
-    log()->info("\t\tBest bit is {:d} with {:d} rules and {:d} ANY bits", best_bit, result.size(), bit_num_dontcare[best_bit]);
+    log()->debug("\t\tBest bit is {:d} with {:d} rules and {:d} ANY bits", best_bit, result.size(), bit_num_dontcare[best_bit]);
 
     if (use_dontcare_heuristic) {
         return make_pair(best_bit - 100000, result);
@@ -153,41 +104,125 @@ auto remove_bit_w_blockers(vector<Filter> const filters, vector<int> const& bits
     }
 }
 
-auto find_exact(vector<Filter> const& filters, vector<int> const& bits_in_use) {
-    auto exact = bits_in_use;
-    for (auto const& filter : filters) {
-        for (auto const bit : bits_in_use) {
-            assert(bit < int(filter.size()));
-            if (filter[bit] == Bit::ANY) {
-                exact.erase(remove(begin(exact), end(exact), bit), end(exact));
-            }
+// Numbers of filters with one, zero and any value at each bit, kept up to date as filters are dropped
+template<size_t W>
+class BitCounts {
+public:
+    explicit BitCounts(vector<Filter<W>> const& filters) 
+        : ones_(W, 0), zeros_(W, 0) {
+        for (auto const& filter : filters) {
+            update(filter, 1);
+        }
+    }
+
+    void remove(Filter<W> const& filter) {
+        update(filter, -1);
+    }
+
+    auto ones(int bit) const {
+        return ones_[bit];
+    }
+
+    auto zeros(int bit) const {
+        return zeros_[bit];
+    }
+
+    auto anys(int bit) const {
+        return total_ - ones_[bit] - zeros_[bit];
+    }
+
+private:
+    void update(Filter<W> const& filter, int delta) {
+        auto const& ones = filter.get_value();
+        auto const zeros = filter.get_mask() & ~filter.get_value();
+        for (auto i = ones._Find_first(); i < ones.size(); i = ones._Find_next(i)) {
+            ones_[i] += delta;
+        }
+        for (auto i = zeros._Find_first(); i < zeros.size(); i = zeros._Find_next(i)) {
+            zeros_[i] += delta;
+        }
+        total_ += delta;
+    }
+
+    vector<int> ones_;
+    vector<int> zeros_;
+    int total_ = 0;
+};
+
+template<size_t W>
+auto find_exact(BitCounts<W> const& counts, vector<int> const& bits_in_use) {
+    vector<int> exact{};
+    for (auto const bit : bits_in_use) {
+        if (counts.anys(bit) == 0) {
+            exact.emplace_back(bit);
         }
     }
     return exact;
 }
 
-auto remove_bit_oi(vector<Filter> const filters, vector<int> const& bits_in_use, vector<int> const& bits_to_avoid) -> pair<int, vector<int>> {
+template<size_t W>
+auto remove_bit_oi(vector<Filter<W>> const filters, vector<int> const& bits_in_use, vector<int> const& bits_to_avoid, Stats* stats) -> pair<int, vector<int>> {
+    auto const oi_indices = find_maximal_oi_subset(filters, bits_in_use, stats);
+
+    // Without a bit the greedy selection stays the same up to the first selected filter
+    // that differs from a filter selected before it only in this bit
+    vector<Filter<W>> selected{};
+    for (auto i : oi_indices) {
+        selected.emplace_back(filters[i]);
+    }
+    OverlapIndex<W> const selected_index{selected, bits_in_use};
+    auto const blockers = selected_index.blockers();
+    count_lookups(stats, selected_index);
+    vector<size_t> first_conflict(filters[0].size(), oi_indices.size());
+    for (auto k = oi_indices.size(); k-- > 0; ) {
+        for (auto const bit : bits_in_use) {
+            if (blockers[k][bit]) {
+                first_conflict[bit] = k;
+            }
+        }
+    }
+
     auto const best_bit = find_best_bit(bits_in_use, bits_to_avoid,
-            [&bits_in_use, &filters] (auto bit) {
-                auto cur_in_use = bits_in_use;
+            [&bits_in_use, &filters, &oi_indices, &first_conflict, stats] (auto bit) {
+                auto const k = first_conflict[bit];
+                if (k == oi_indices.size()) {
+                    return int(k);
+                }
 
+                auto cur_in_use = bits_in_use;
                 cur_in_use.erase(find(begin(cur_in_use), end(cur_in_use), bit));
-                
-                return int(find_maximal_oi_subset(filters, cur_in_use).size());
+
+                IntersectionIndex<W> cur_selected{cur_in_use};
+                for (auto l = 0u; l < k; l++) {
+                    cur_selected.insert(filters[oi_indices[l]]);
+                }
+
+                auto result = int(k);
+                for (auto i = oi_indices[k] + 1; i < int(filters.size()); i++) {
+                    if (!cur_selected.intersects(filters[i])) {
+                        cur_selected.insert(filters[i]);
+                        result++;
+                    }
+                }
+                count_lookups(stats, cur_selected);
+                return result;
             }, std::greater<>());
 
     assert(best_bit >= 0);
 
-    return make_pair(best_bit, find_maximal_oi_subset(filters, bits_in_use));
+    return make_pair(best_bit, oi_indices);
 }
 
 
 } // namespace
 
 
-auto p4t::best_min_similarity_bits(vector<Filter> const& filters, size_t l) -> vector<int> {
+template<size_t W>
+auto p4t::best_min_similarity_bits(vector<Filter<W>> const& filters, size_t l) -> vector<int> {
     assert(!filters.empty());
 
+    BitCounts<W> const counts{filters};
+
     vector<int> result{};
     while (result.size() < l) {
         auto best_bit = -1;
@@ -196,16 +231,8 @@ auto p4t::best_min_similarity_bits(vector<Filter> const& filters, size_t l) -> v
             if (find(begin(result), end(result), i) != end(result)) {
                 continue;
             }
-            auto count_zero = 0;
-            auto count_one = 0;
-            for (auto const& f : filters) {
-                if (f[i] == Bit::ANY || f[i] == Bit::ONE) {
-                    count_one++;
-                } 
-                if (f[i] == Bit::ANY || f[i] == Bit::ZERO) {
-                    count_zero++;
-                }
-            }
+            auto const count_zero = counts.zeros(i) + counts.anys(i);
+            auto const count_one = counts.ones(i) + counts.anys(i);
             auto const value = std::max(count_zero, count_one);
             if (best_bit == -1 || value < best_value) {
                 best_bit = i;
@@ -220,33 +247,38 @@ auto p4t::best_min_similarity_bits(vector<Filter> const& filters, size_t l) -> v
 }
 
 
-auto p4t::best_to_stay_minme(vector<Filter> filters, size_t l, MinMEMode mode, bool only_exact) -> std::pair<vector<int>, vector<int>> {
+template<size_t W>
+auto p4t::best_to_stay_minme(vector<Filter<W>> filters, size_t l, MinMEMode mode, bool only_exact, Stats* stats) -> std::pair<vector<int>, vector<int>> {
     assert(!filters.empty());
     log()->info("starting minme; mode: {:d}; only exact: {:b}", mode, only_exact);
 
+    auto const width = filters[0].size();
     vector<int> bits_in_use{};
-    for (auto i = 0u; i < filters[0].size(); i++) {
+    for (auto i = 0u; i < width; i++) {
         bits_in_use.emplace_back(i);
     }
 
-    auto exact_bits_in_use = find_exact(filters, bits_in_use);
+    BitCounts<W> counts{filters};
+    auto exact_bits_in_use = find_exact(counts, bits_in_use);
 
     vector<int> indices(filters.size());
     std::iota(begin(indices), end(indices), 0);
 
+    // Only the blockers are looked up in the index, so it is not maintained in other modes
+    std::unique_ptr<OverlapIndex<W>> index{};
+    if (mode == MinMEMode::BLOCKERS) {
+        index = std::make_unique<OverlapIndex<W>>(filters, bits_in_use);
+    }
+
     while (bits_in_use.size() > l || (only_exact && bits_in_use != exact_bits_in_use)) {
-        int bit_to_remove;
+        int bit_to_remove = 0;
         vector<int> oi_indices;
 
         auto const bits_to_avoid = only_exact ? exact_bits_in_use : vector<int>();
 
         vector<int> bit_num_dontcare(filters[0].size(), 0);
-        for (auto const& filter : filters) {
-            for (auto i : bits_in_use) {
-                if (filter[i] == Bit::ANY) {
-                    bit_num_dontcare[i]++;
-                }
-            }
+        for (auto i : bits_in_use) {
+            bit_num_dontcare[i] = counts.anys(i);
         }
 
         // for (size_t i=0; i<bit_num_dontcare.size(); i++) {
@@ -255,10 +287,10 @@ auto p4t::best_to_stay_minme(vector<Filter> filters, size_t l, MinMEMode mode, b
 
         switch(mode) {
             case MinMEMode::MAX_OI: 
-                tie(bit_to_remove, oi_indices) = remove_bit_oi(filters, bits_in_use, bits_to_avoid);
+                tie(bit_to_remove, oi_indices) = remove_bit_oi(filters, bits_in_use, bits_to_avoid, stats);
                 break;
             case MinMEMode::BLOCKERS:
-                tie(bit_to_remove, oi_indices) = remove_bit_w_blockers(filters, bits_in_use, bits_to_avoid, bit_num_dontcare, l);
+                tie(bit_to_remove, oi_indices) = remove_bit_w_blockers(*index, bits_in_use, bits_to_avoid, bit_num_dontcare, l);
                 break;
         }
 
@@ -273,7 +305,7 @@ auto p4t::best_to_stay_minme(vector<Filter> filters, size_t l, MinMEMode mode, b
             });
             vector<int> cur_in_use;
             for (uint i=0; i<l; i++) {
-                log()->info("\tbit {:d} with {:d} ANY bits", indices_sorted_by_dontcare[i], bit_num_dontcare[indices_sorted_by_dontcare[i]]);
+                log()->debug("\tbit {:d} with {:d} ANY bits", indices_sorted_by_dontcare[i], bit_num_dontcare[indices_sorted_by_dontcare[i]]);
                 cur_in_use.emplace_back(indices_sorted_by_dontcare[i]);
             }
 
@@ -300,31 +332,50 @@ auto p4t::best_to_stay_minme(vector<Filter> filters, size_t l, MinMEMode mode, b
                 bit_to_remove = bit_to_remove + 100000;
             } else {
                 bits_in_use = cur_in_use;
-                oi_indices = find_maximal_oi_subset_indices(filters, new_exact_indices, cur_in_use);
+                oi_indices = find_maximal_oi_subset_indices(filters, new_exact_indices, cur_in_use, stats);
                 log()->info("\tchecking OI indices with {:d}/{:d} bits, exact {:d}, OI {:d}", bits_in_use.size(), cur_in_use.size(), new_exact_indices.size(), oi_indices.size() );
             }
         } 
 
         if (!use_dontcare_heuristic) {
             bits_in_use.erase(find(begin(bits_in_use), end(bits_in_use), bit_to_remove));
+            if (index) {
+                index->remove_bit(bit_to_remove);
+                index->keep(oi_indices);
+            }
         }
 
         // bits_in_use.erase(find(begin(bits_in_use), end(bits_in_use), bit_to_remove));
 
         vector<int> new_indices{};
-        vector<Filter> new_filters{};
+        vector<Filter<W>> new_filters{};
 
         for (auto i : oi_indices) {
             new_indices.emplace_back(indices[i]);
             new_filters.emplace_back(filters[i]);
         }
 
+        // Subtracting the dropped filters is cheaper unless most of them are dropped
+        if (2 * oi_indices.size() < filters.size()) {
+            counts = BitCounts<W>{new_filters};
+        } else {
+            vector<bool> kept(filters.size(), false);
+            for (auto i : oi_indices) {
+                kept[i] = true;
+            }
+            for (auto i = 0u; i < filters.size(); i++) {
+                if (!kept[i]) {
+                    counts.remove(filters[i]);
+                }
+            }
+        }
+
         std::swap(indices, new_indices);
         std::swap(filters, new_filters);
 
-        exact_bits_in_use = find_exact(filters, bits_in_use);
+        exact_bits_in_use = find_exact(counts, bits_in_use);
 
-        log()->info("bit {:d} has been found; bits left: {:d}; exact bits left: {:d}; entries left: {:d}", bit_to_remove, bits_in_use.size(), exact_bits_in_use.size(), filters.size());
+        log()->debug("bit {:d} has been found; bits left: {:d}; exact bits left: {:d}; entries left: {:d}", bit_to_remove, bits_in_use.size(), exact_bits_in_use.size(), filters.size());
 
         if (use_dontcare_heuristic) {
             break;
@@ -333,45 +384,50 @@ auto p4t::best_to_stay_minme(vector<Filter> filters, size_t l, MinMEMode mode, b
 
     assert(is_oi(filters, bits_in_use));
 
+    if (index) {
+        count_lookups(stats, *index);
+    }
+    count(stats, "bits_removed", width - bits_in_use.size());
+
     return make_pair(bits_in_use, indices);
 }
 
 
-auto p4t::find_maximal_oi_subset(vector<Filter> const& filters, vector<int> const& bits) -> vector<int> {
+template<size_t W>
+auto p4t::find_maximal_oi_subset(vector<Filter<W>> const& filters, vector<int> const& bits_in_use, Stats* stats) -> vector<int> {
     vector<int> result{};
+    IntersectionIndex<W> selected{bits_in_use};
 
     for (auto i = 0u; i < filters.size(); i++) {
-        auto intersects = false;
-        for (auto j : result) {
-            if (intersect(filters[j], filters[i], bits)) {
-                intersects = true;
-                break;
-            }
-        }
-        if (!intersects) {
+        if (!selected.intersects(filters[i])) {
+            selected.insert(filters[i]);
             result.emplace_back(i);
         }
     }
+    count_lookups(stats, selected);
 
     return result;
 }
 
-auto p4t::find_maximal_oi_subset_indices(vector<Filter> const& filters, vector<size_t> const& indices, vector<int> const& bits) -> vector<int> {
+template<size_t W>
+auto p4t::find_maximal_oi_subset_indices(vector<Filter<W>> const& filters, vector<size_t> const& indices, vector<int> const& bits_in_use, Stats* stats) -> vector<int> {
     vector<int> result{};
+    IntersectionIndex<W> selected{bits_in_use};
 
     for (auto i : indices) {
-        auto intersects = false;
-        for (auto j : result) {
-            if (intersect(filters[j], filters[i], bits)) {
-                intersects = true;
-                break;
-            }
-        }
-        if (!intersects) {
+        if (!selected.intersects(filters[i])) {
+            selected.insert(filters[i]);
             result.emplace_back(i);
         }
     }
+    count_lookups(stats, selected);
 
     return result;
 }
 
+#define INSTANTIATE(W) \
+    template auto p4t::best_min_similarity_bits<W>(vector<Filter<W>> const&, size_t) -> vector<int>; \
+    template auto p4t::best_to_stay_minme<W>(vector<Filter<W>>, size_t, MinMEMode, bool, Stats*) -> pair<vector<int>, vector<int>>; \
+    template auto p4t::find_maximal_oi_subset<W>(vector<Filter<W>> const&, vector<int> const&, Stats*) -> vector<int>; \
+    template auto p4t::find_maximal_oi_subset_indices<W>(vector<Filter<W>> const&, vector<size_t> const&, vector<int> const&, Stats*) -> vector<int>;
+P4T_FOR_EACH_WIDTH(INSTANTIATE)
@@ -3,6 +3,7 @@
 
 #include "common.h"
 #include "filter.h"
+#include "stats.h"
 
 namespace p4t {
 
@@ -10,10 +11,14 @@ enum MinMEMode {
     MAX_OI, BLOCKERS
 };
 
-auto best_min_similarity_bits(vector<Filter> const& filters, size_t l) -> vector<int>;
-auto best_to_stay_minme(vector<Filter> filters, size_t l, MinMEMode mode, bool only_exact) -> pair<vector<int>, vector<int>>;
-auto find_maximal_oi_subset(vector<Filter> const& filters, vector<int> const& bits) -> vector<int>;
-auto find_maximal_oi_subset_indices(vector<Filter> const& filters, vector<size_t> const& indices, vector<int> const& bits) -> vector<int>;
+template<size_t W>
+auto best_min_similarity_bits(vector<Filter<W>> const& filters, size_t l) -> vector<int>;
+template<size_t W>
+auto best_to_stay_minme(vector<Filter<W>> filters, size_t l, MinMEMode mode, bool only_exact, Stats* stats = nullptr) -> pair<vector<int>, vector<int>>;
+template<size_t W>
+auto find_maximal_oi_subset(vector<Filter<W>> const& filters, vector<int> const& bits, Stats* stats = nullptr) -> vector<int>;
+template<size_t W>
+auto find_maximal_oi_subset_indices(vector<Filter<W>> const& filters, vector<size_t> const& indices, vector<int> const& bits, Stats* stats = nullptr) -> vector<int>;
 
 }
 
@@ -0,0 +1,280 @@
+#include <atomic>
+#include <numeric>
+#include <parallel/algorithm>
+
+#include "overlap_index.h"
+
+namespace {
+
+using namespace p4t;
+
+using std::begin;
+using std::end;
+
+// Pairs of groups this small are cheaper to compare directly than to hash
+auto constexpr MAX_DIRECT_PAIRS_PER_MEMBER = 8;
+
+// Groups this small are scanned instead of being projected
+auto constexpr MAX_SCANNED_GROUP_SIZE = 16;
+
+// Splits the bits into two halves of interleaved bits, filters that differ in exactly
+// one of the bits agree on one of the halves
+template<size_t W>
+auto split(bitarray<W> const& bits) {
+    bitarray<W> first{};
+    bitarray<W> second{};
+    auto odd = false;
+    for (auto i = bits._Find_first(); i < bits.size(); i = bits._Find_next(i)) {
+        (odd ? second : first).set(i);
+        odd = !odd;
+    }
+    return make_pair(first, second);
+}
+
+template<size_t W>
+using Buckets = std::unordered_map<bitarray<W>, vector<int>>;
+
+template<size_t W>
+auto make_buckets(vector<Filter<W>> const& filters, vector<int> const& members, bitarray<W> const& bits) {
+    Buckets<W> result{};
+    for (auto j : members) {
+        result[filters[j].get_value() & bits].emplace_back(j);
+    }
+    return result;
+}
+
+}
+
+template<size_t W>
+p4t::OverlapIndex<W>::OverlapIndex(vector<Filter<W>> const& filters, vector<int> const& bits_in_use)
+    : filters_{filters}, bits_{to_bitarray<W>(bits_in_use)} {
+    vector<Group> groups{};
+    for (auto i = 0u; i < filters_.size(); i++) {
+        groups.push_back(Group{filters_[i].get_mask(), {int(i)}});
+    }
+    regroup(move(groups));
+}
+
+// Merges groups that have the same mask on the bits in use
+template<size_t W>
+void p4t::OverlapIndex<W>::regroup(vector<Group> groups) {
+    std::unordered_map<bitarray<W>, int> mask2group{};
+    groups_.clear();
+    for (auto& group : groups) {
+        auto const mask = group.mask & bits_;
+        auto const it = mask2group.find(mask);
+        if (it == end(mask2group)) {
+            mask2group[mask] = groups_.size();
+            groups_.push_back(Group{mask, move(group.members)});
+        } else {
+            auto& members = groups_[it->second].members;
+            auto const middle = members.size();
+            members.insert(end(members), begin(group.members), end(group.members));
+            std::inplace_merge(begin(members), begin(members) + middle, end(members));
+        }
+    }
+}
+
+template<size_t W>
+void p4t::OverlapIndex<W>::remove_bit(int bit) {
+    bits_.reset(bit);
+    regroup(move(groups_));
+}
+
+template<size_t W>
+void p4t::OverlapIndex<W>::keep(vector<int> const& indices) {
+    vector<int> renumbered(filters_.size(), -1);
+    vector<Filter<W>> filters{};
+    for (auto i : indices) {
+        renumbered[i] = filters.size();
+        filters.emplace_back(filters_[i]);
+    }
+    filters_ = move(filters);
+
+    vector<Group> groups{};
+    for (auto const& group : groups_) {
+        vector<int> members{};
+        for (auto i : group.members) {
+            if (renumbered[i] != -1) {
+                members.emplace_back(renumbered[i]);
+            }
+        }
+        if (!members.empty()) {
+            groups.push_back(Group{group.mask, move(members)});
+        }
+    }
+    groups_ = move(groups);
+}
+
+template<size_t W>
+auto p4t::OverlapIndex<W>::find_overlaps(bool with_blockers) const -> pair<vector<bool>, vector<bitarray<W>>> {
+    vector<char> intersects(filters_.size(), false);
+    vector<bitarray<W>> one_bit_differences(with_blockers ? filters_.size() : 0);
+
+    auto const& filters = filters_;
+    auto const& bits = bits_;
+    auto const check = [&filters, &bits, &intersects, &one_bit_differences, with_blockers](int i, int j) {
+        auto const diff = difference(filters[i], filters[j], bits);
+        auto const num_differences = diff.count();
+        if (num_differences == 0) {
+            intersects[i] = true;
+        } else if (with_blockers && num_differences == 1) {
+            one_bit_differences[i] |= diff;
+        }
+    };
+
+    vector<int> group_indices(groups_.size());
+    std::iota(begin(group_indices), end(group_indices), 0);
+
+    std::atomic<long long> comparisons{0};
+    std::atomic<long long> probes{0};
+
+    // Each group of lower priority filters is handled by a single thread, so no two threads write the same filter
+    __gnu_parallel::for_each(begin(group_indices), end(group_indices),
+        [this, &check, &intersects, &comparisons, &probes, with_blockers] (auto h) {
+            auto group_comparisons = 0ll;
+            auto group_probes = 0ll;
+
+            auto const& lower = groups_[h].members;
+            for (auto const& group : groups_) {
+                auto const& higher = group.members;
+                if (higher.front() > lower.back()) {
+                    continue;
+                }
+
+                if (lower.size() * higher.size() <= MAX_DIRECT_PAIRS_PER_MEMBER * (lower.size() + higher.size())) {
+                    for (auto i : lower) {
+                        for (auto j = begin(higher); j != end(higher) && *j < i; ++j) {
+                            check(i, *j);
+                            group_comparisons++;
+                        }
+                    }
+                    continue;
+                }
+
+                auto const common = groups_[h].mask & group.mask;
+
+                // It is enough to know the first filter with the given value on the common bits
+                std::unordered_map<bitarray<W>, int> first{};
+                for (auto j : higher) {
+                    first.emplace(filters_[j].get_value() & common, j);
+                }
+                group_probes += lower.size();
+                for (auto i : lower) {
+                    auto const it = first.find(filters_[i].get_value() & common);
+                    if (it != end(first) && it->second < i) {
+                        intersects[i] = true;
+                    }
+                }
+
+                if (!with_blockers) {
+                    continue;
+                }
+
+                auto const halves = split(common);
+                for (auto const& half : {halves.first, halves.second}) {
+                    auto const buckets = make_buckets(filters_, higher, half);
+                    group_probes += lower.size();
+                    for (auto i : lower) {
+                        auto const it = buckets.find(filters_[i].get_value() & half);
+                        if (it == end(buckets)) {
+                            continue;
+                        }
+                        for (auto j = begin(it->second); j != end(it->second) && *j < i; ++j) {
+                            check(i, *j);
+                            group_comparisons++;
+                        }
+                    }
+                }
+            }
+
+            comparisons += group_comparisons;
+            probes += group_probes;
+        }
+    );
+
+    comparisons_ += comparisons;
+    probes_ += probes;
+
+    return make_pair(vector<bool>(begin(intersects), end(intersects)), one_bit_differences);
+}
+
+template<size_t W>
+auto p4t::OverlapIndex<W>::is_oi() const -> bool {
+    auto const intersects = find_overlaps(false).first;
+    return std::find(begin(intersects), end(intersects), true) == end(intersects);
+}
+
+template<size_t W>
+auto p4t::OverlapIndex<W>::blockers() const -> vector<bitarray<W>> {
+    vector<bool> intersects{};
+    vector<bitarray<W>> result{};
+    tie(intersects, result) = find_overlaps(true);
+    for (auto i = 0u; i < result.size(); i++) {
+        if (intersects[i]) {
+            result[i] = bits_;
+        }
+    }
+    return result;
+}
+
+template<size_t W>
+p4t::IntersectionIndex<W>::IntersectionIndex(vector<int> const& bits_in_use)
+    : bits_{to_bitarray<W>(bits_in_use)} {
+}
+
+template<size_t W>
+auto p4t::IntersectionIndex<W>::intersects(Filter<W> const& filter) -> bool {
+    auto const mask = filter.get_mask() & bits_;
+    for (auto& group : groups_) {
+        auto const common = mask & group.mask;
+        auto const value = filter.get_value() & common;
+
+        if (group.values.size() <= MAX_SCANNED_GROUP_SIZE) {
+            for (auto const& v : group.values) {
+                comparisons_++;
+                if ((v & common) == value) {
+                    return true;
+                }
+            }
+            continue;
+        }
+
+        auto it = group.projections.find(common);
+        if (it == end(group.projections)) {
+            it = group.projections.emplace(common, std::unordered_set<bitarray<W>>{}).first;
+            for (auto const& v : group.values) {
+                it->second.insert(v & common);
+            }
+        }
+        probes_++;
+        if (it->second.count(value)) {
+            return true;
+        }
+    }
+    return false;
+}
+
+template<size_t W>
+void p4t::IntersectionIndex<W>::insert(Filter<W> const& filter) {
+    auto const mask = filter.get_mask() & bits_;
+    auto const value = filter.get_value() & mask;
+
+    auto const it = mask2group_.find(mask);
+    if (it == end(mask2group_)) {
+        mask2group_[mask] = groups_.size();
+        groups_.push_back(Group{mask, {value}, {}});
+        return;
+    }
+
+    auto& group = groups_[it->second];
+    group.values.emplace_back(value);
+    for (auto& common_n_projection : group.projections) {
+        common_n_projection.second.insert(value & common_n_projection.first);
+    }
+}
+
+#define INSTANTIATE(W) \
+    template class p4t::OverlapIndex<W>; \
+    template class p4t::IntersectionIndex<W>;
+P4T_FOR_EACH_WIDTH(INSTANTIATE)
@@ -0,0 +1,95 @@
+#ifndef OVERLAP_INDEX_H
+#define OVERLAP_INDEX_H
+
+#include <unordered_map>
+#include <unordered_set>
+
+#include "common.h"
+#include "filter.h"
+
+namespace p4t {
+
+// Filters grouped by their masks on the bits in use. Filters of two groups can intersect
+// only if they agree on the bits exact in both groups, so the overlapping pairs of two
+// groups are found by hashing instead of comparing all pairs. The grouping is kept up to
+// date as bits and filters are removed.
+template<size_t W>
+class OverlapIndex {
+public:
+    OverlapIndex(vector<Filter<W>> const& filters, vector<int> const& bits_in_use);
+
+    // Whether no filter intersects a filter of a higher priority (a smaller index)
+    auto is_oi() const -> bool;
+
+    // For each filter: all bits in use if it intersects a filter of a higher priority,
+    // otherwise the bits in which it differs from such a filter in exactly one bit
+    auto blockers() const -> vector<bitarray<W>>;
+
+    void remove_bit(int bit);
+
+    // Keeps only the given filters (in increasing order), they are renumbered from zero
+    void keep(vector<int> const& indices);
+
+    // Numbers of filter comparisons and hash lookups made so far
+    auto num_comparisons() const {
+        return comparisons_;
+    }
+
+    auto num_probes() const {
+        return probes_;
+    }
+
+private:
+    struct Group {
+        bitarray<W> mask;
+        vector<int> members; // in increasing order
+    };
+
+    void regroup(vector<Group> groups);
+    auto find_overlaps(bool with_blockers) const -> pair<vector<bool>, vector<bitarray<W>>>;
+
+    vector<Filter<W>> filters_;
+    bitarray<W> bits_;
+    vector<Group> groups_;
+
+    mutable long long comparisons_ = 0;
+    mutable long long probes_ = 0;
+};
+
+// A growing set of filters that answers whether a filter intersects any of them on the
+// bits in use. Filters are grouped by their masks, each group keeps hash sets of its
+// values projected on the bits it shares with the masks of the queries seen so far.
+template<size_t W>
+class IntersectionIndex {
+public:
+    explicit IntersectionIndex(vector<int> const& bits_in_use);
+
+    auto intersects(Filter<W> const& filter) -> bool;
+    void insert(Filter<W> const& filter);
+
+    auto num_comparisons() const {
+        return comparisons_;
+    }
+
+    auto num_probes() const {
+        return probes_;
+    }
+
+private:
+    struct Group {
+        bitarray<W> mask;
+        vector<bitarray<W>> values;
+        std::unordered_map<bitarray<W>, std::unordered_set<bitarray<W>>> projections;
+    };
+
+    bitarray<W> bits_;
+    vector<Group> groups_;
+    std::unordered_map<bitarray<W>, int> mask2group_;
+
+    long long comparisons_ = 0;
+    long long probes_ = 0;
+};
+
+}
+
+#endif
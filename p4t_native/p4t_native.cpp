@@ -4,6 +4,8 @@
 #include <map>
 #include <omp.h>
 
+#include <boost/make_shared.hpp>
+
 #include "filter.h"
 #include "support.h"
 #include "utils.h"
@@ -17,11 +19,12 @@ namespace {
 
 using namespace p4t;
 
+template<size_t W>
 auto map_partition_indices(
-        vector<vector<Support>> const& partition, 
-        vector<Support> const & supports) -> vector<vector<int>> {
+        vector<vector<Support<W>>> const& partition, 
+        vector<Support<W>> const & supports) -> vector<vector<int>> {
 
-    support_map<int> support2partition{};
+    support_map<W, int> support2partition{};
     for (auto i = 0u; i < partition.size(); i++) {
         for (auto const& s : partition[i]) {
             support2partition[s] = i;
@@ -38,9 +41,10 @@ auto map_partition_indices(
     return result;
 }
 
-auto weight(vector<Support> const& unique_supports, 
-        vector<Support> const& all_supports) -> vector<int> {
-    support_map<int> support_cnt{};
+template<size_t W>
+auto weight(vector<Support<W>> const& unique_supports, 
+        vector<Support<W>> const& all_supports) -> vector<int> {
+    support_map<W, int> support_cnt{};
 
     for (auto const& support : all_supports) {
         support_cnt[support]++;
@@ -54,121 +58,388 @@ auto weight(vector<Support> const& unique_supports,
     return result;
 }
 
-auto select_unique_n_weight(vector<Support> const& supports) 
-    -> pair<vector<Support>, vector<int>> {
+template<size_t W>
+auto select_unique_n_weight(vector<Support<W>> const& supports) 
+    -> pair<vector<Support<W>>, vector<int>> {
     auto const unique = select_unique(supports);
     auto const weights = weight(unique, supports);
     return make_pair(unique, weights);
 }
 
-auto svmrs2supports(py::object svmrs) {
-    vector<vector<Support>> sss(len(svmrs));
+// Filters are read while holding the GIL, everything else is done without it
+template<size_t W>
+auto svmrs2filters(py::object svmrs) {
+    vector<vector<Filter<W>>> n_filters(len(svmrs));
     for (auto i = 0; i < len(svmrs); ++i) {
-        sss[i] = to_supports(svmr2filters(svmrs[i]));
+        n_filters[i] = svmr2filters<W>(svmrs[i]);
+    }
+    return n_filters;
+}
+
+template<size_t W>
+auto filters2supports(vector<vector<Filter<W>>> const& n_filters) {
+    vector<vector<Support<W>>> sss(n_filters.size());
+    #pragma omp parallel for schedule(dynamic)
+    for (auto i = 0; i < int(n_filters.size()); ++i) {
+        sss[i] = to_supports(n_filters[i]);
     }
     return sss;
 }
 
-} // namespace 
+// Sets the number of OpenMP threads for the rest of the call, zero keeps the current setting
+class NumThreadsGuard {
+public:
+    explicit NumThreadsGuard(int num_threads) : old_num_threads_{omp_get_max_threads()} {
+        if (num_threads > 0) {
+            omp_set_num_threads(num_threads);
+        }
+    }
 
-auto p4t::min_pmgr(py::object svmr) -> py::object {
-    if (py::len(svmr) == 0) {
-        return py::object();
+    NumThreadsGuard(NumThreadsGuard const&) = delete;
+    NumThreadsGuard& operator=(NumThreadsGuard const&) = delete;
+
+    ~NumThreadsGuard() {
+        omp_set_num_threads(old_num_threads_);
     }
 
-    auto const filters = svmr2filters(svmr);
+private:
+    int const old_num_threads_;
+};
 
-    auto const supports = to_supports(filters);
-    auto const supports_unique = select_unique(supports);
+auto to_stats(py::object const& stats) -> Stats* {
+    if (stats.is_none()) {
+        return nullptr;
+    }
+    return &py::extract<Stats&>(stats)();
+}
 
-    auto const partition = find_min_chain_partition(supports_unique);
-    auto const partition_indices = map_partition_indices(partition, supports);
+template<size_t W>
+auto delta2python(ChainPartitionDelta<W> const& delta) -> py::object {
+    return py::make_tuple(to_python(delta.groups), to_python(delta.removed), to_python(delta.moved));
+}
 
+
+template<size_t W>
+auto min_pmgr_impl(py::object const& svmr, int num_threads, Stats* stats) -> py::object {
+    vector<Filter<W>> filters{};
+    {
+        PhaseTimer const timer{stats, "ingest"};
+        filters = svmr2filters<W>(svmr);
+    }
+
+    vector<vector<Support<W>>> partition{};
+    vector<vector<int>> partition_indices{};
+    {
+        GILRelease const no_gil{};
+        NumThreadsGuard const threads{num_threads};
+
+        vector<Support<W>> supports{};
+        vector<Support<W>> supports_unique{};
+        {
+            PhaseTimer const timer{stats, "dedup"};
+            supports = to_supports(filters);
+            supports_unique = select_unique(supports);
+        }
+
+        partition = find_min_chain_partition(supports_unique, stats);
+
+        PhaseTimer const timer{stats, "index_mapping"};
+        partition_indices = map_partition_indices(partition, supports);
+    }
+
+    PhaseTimer const timer{stats, "conversion"};
     return py::make_tuple(to_python(partition), to_python(partition_indices));
 }
 
-auto p4t::min_bmgr(py::object svmrs, int max_num_groups) -> py::object {
-    auto const n_supports = svmrs2supports(svmrs);
-
-    vector<vector<Support>> n_unique_supports(n_supports.size());
-    vector<vector<int>> n_weights(n_supports.size());
-    for (auto i = 0u; i < n_supports.size(); ++i) {
-        tie(n_unique_supports[i], n_weights[i]) = select_unique_n_weight(n_supports[i]);
+template<size_t W>
+auto min_bmgr_impl(py::object const& svmrs, int max_num_groups, int num_threads, Stats* stats) -> py::object {
+    vector<vector<Filter<W>>> n_filters{};
+    {
+        PhaseTimer const timer{stats, "ingest"};
+        n_filters = svmrs2filters<W>(svmrs);
     }
-    
-    auto const partitions = find_min_bounded_chain_partition(
-        n_unique_supports, n_weights, max_num_groups
-    );
 
-    vector<vector<vector<int>>> n_partition_indices(len(svmrs));
-    for (auto i = 0; i < len(svmrs); i++) {
-        n_partition_indices[i] = map_partition_indices(partitions[i], n_supports[i]);
+    vector<vector<vector<Support<W>>>> partitions{};
+    vector<vector<vector<int>>> n_partition_indices(n_filters.size());
+    {
+        GILRelease const no_gil{};
+        NumThreadsGuard const threads{num_threads};
+
+        vector<vector<Support<W>>> n_supports{};
+        vector<vector<Support<W>>> n_unique_supports(n_filters.size());
+        vector<vector<int>> n_weights(n_filters.size());
+        {
+            PhaseTimer const timer{stats, "dedup"};
+            n_supports = filters2supports(n_filters);
+            #pragma omp parallel for schedule(dynamic)
+            for (auto i = 0; i < int(n_supports.size()); ++i) {
+                tie(n_unique_supports[i], n_weights[i]) = select_unique_n_weight(n_supports[i]);
+            }
+        }
+
+        partitions = find_min_bounded_chain_partition(
+            n_unique_supports, n_weights, max_num_groups, stats
+        );
+
+        PhaseTimer const timer{stats, "index_mapping"};
+        #pragma omp parallel for schedule(dynamic)
+        for (auto i = 0; i < int(n_supports.size()); i++) {
+            n_partition_indices[i] = map_partition_indices(partitions[i], n_supports[i]);
+        }
     }
 
+    PhaseTimer const timer{stats, "conversion"};
     return py::make_tuple(to_python(partitions), to_python(n_partition_indices));
 }
 
-auto p4t::best_subgroup(py::object svmr, int l, bool only_exact, string algo) -> py::object {
-    auto const filters = svmr2filters(svmr);
+auto is_subgroup_algo(string const& algo) -> bool {
+    return algo == "min_similarity" || algo == "icnp_oi" || algo == "icnp_blockers";
+}
 
+// Bits and indices of the best subgroup of filters, must be called without GIL
+template<size_t W>
+auto select_subgroup(vector<Filter<W>> const& filters, int l, bool only_exact, string const& algo, Stats* stats) 
+        -> pair<vector<int>, vector<int>> {
     if (algo == "min_similarity") {
-        auto const bits = best_min_similarity_bits(filters, l);
-        auto const result = find_maximal_oi_subset(filters, bits);
-
-        return py::make_tuple(to_python(bits), to_python(result));
-    } else  if (algo == "icnp_oi" || algo == "icnp_blockers") {
+        vector<int> bits{};
+        {
+            PhaseTimer const timer{stats, "bit_selection"};
+            bits = best_min_similarity_bits(filters, l);
+        }
+        PhaseTimer const timer{stats, "oi_selection"};
+        auto result = find_maximal_oi_subset(filters, bits, stats);
+        return {bits, result};
+    } else {
         auto const minme_mode = algo == "icnp_oi" ? MinMEMode::MAX_OI : MinMEMode::BLOCKERS;
-        auto const bits_n_result = best_to_stay_minme(filters, l, minme_mode, only_exact);
+        PhaseTimer const timer{stats, "bit_selection"};
+        return best_to_stay_minme(filters, l, minme_mode, only_exact, stats);
+    }
+}
 
-        return py::make_tuple(to_python(bits_n_result.first), to_python(bits_n_result.second));
-    } else {
+template<size_t W>
+auto best_subgroup_impl(py::object const& svmr, int l, bool only_exact, string const& algo, int num_threads, Stats* stats) -> py::object {
+    if (!is_subgroup_algo(algo)) {
         return py::object();
     }
-}
 
-void p4t::set_num_threads(int num_threads) {
-    omp_set_dynamic(false);
-    omp_set_num_threads(num_threads);
+    vector<Filter<W>> filters{};
+    {
+        PhaseTimer const timer{stats, "ingest"};
+        filters = svmr2filters<W>(svmr);
+    }
+
+    pair<vector<int>, vector<int>> bits_n_result{};
+    {
+        GILRelease const no_gil{};
+        NumThreadsGuard const threads{num_threads};
+        bits_n_result = select_subgroup(filters, l, only_exact, algo, stats);
+    }
+
+    PhaseTimer const timer{stats, "conversion"};
+    return py::make_tuple(to_python(bits_n_result.first), to_python(bits_n_result.second));
 }
 
+template<size_t W>
+auto best_subgroups_impl(
+        py::object const& svmr, int l, string const& algo, bool only_exact, int max_num_groups, 
+        py::object const& progress, int num_threads, Stats* stats) -> py::object {
+    if (!is_subgroup_algo(algo)) {
+        throw std::invalid_argument("unknown algo: " + algo);
+    }
 
-auto p4t::min_pmgr_w_expansions(py::object svmrs, int max_memory) -> py::object {
-    if (len(svmrs) == 0) {
-        return py::object();
+    vector<Filter<W>> filters{};
+    if (svmr_size(svmr) > 0) {
+        PhaseTimer const timer{stats, "ingest"};
+        filters = svmr2filters<W>(svmr);
     }
 
-    auto const n_supports = svmrs2supports(svmrs);
+    // original indices of the remaining filters
+    vector<int> remaining(filters.size());
+    std::iota(begin(remaining), end(remaining), 0);
+
+    vector<vector<int>> n_bits{};
+    vector<vector<int>> n_indices{};
+    while ((max_num_groups < 0 || int(n_bits.size()) < max_num_groups) && !filters.empty()) {
+        {
+            GILRelease const no_gil{};
+            NumThreadsGuard const threads{num_threads};
+
+            auto const bits_n_result = select_subgroup(filters, l, only_exact, algo, stats);
+
+            vector<bool> selected(filters.size(), false);
+            vector<int> indices{};
+            for (auto i : bits_n_result.second) {
+                selected[i] = true;
+                indices.emplace_back(remaining[i]);
+            }
+
+            auto j = 0u;
+            for (auto i = 0u; i < filters.size(); i++) {
+                if (!selected[i]) {
+                    filters[j] = filters[i];
+                    remaining[j] = remaining[i];
+                    j++;
+                }
+            }
+            filters.resize(j);
+            remaining.resize(j);
+
+            n_bits.emplace_back(bits_n_result.first);
+            n_indices.emplace_back(std::move(indices));
+        }
 
-    vector<vector<Support>> n_unique_supports(n_supports.size());
-    vector<vector<int>> n_weights(n_supports.size());
-    for (auto i = 0u; i < n_supports.size(); ++i) {
-        tie(n_unique_supports[i], n_weights[i]) = select_unique_n_weight(n_supports[i]);
+        count(stats, "groups", 1);
+        if (!progress.is_none()) {
+            progress(n_bits.size(), filters.size());
+        }
     }
 
-    vector<vector<Support>> n_exp_unique_supports{};
-    vector<support_map<Support>> expansions{};
-    tie(n_exp_unique_supports, expansions) = 
-        find_min_chain_partition_w_expansion(n_unique_supports, n_weights, max_memory);
+    PhaseTimer const timer{stats, "conversion"};
+    return py::make_tuple(to_python(n_bits), to_python(n_indices));
+}
 
-    for (auto i = 0u; i < n_supports.size(); ++i) {
-        log()->info("for set# {:d}, old size is {:d} and new size is {:d}", i, n_unique_supports[i].size(), n_exp_unique_supports[i].size());
+template<size_t W>
+auto min_pmgr_w_expansions_impl(py::object const& svmrs, int max_memory, int num_threads, Stats* stats) -> py::object {
+    vector<vector<Filter<W>>> n_filters{};
+    {
+        PhaseTimer const timer{stats, "ingest"};
+        n_filters = svmrs2filters<W>(svmrs);
     }
 
-    vector<vector<vector<Support>>> partitions;
-    for (auto const& supports : n_exp_unique_supports) {
-        partitions.emplace_back(find_min_chain_partition(supports));
-    }
+    vector<vector<vector<Support<W>>>> partitions(n_filters.size());
+    vector<pair<vector<vector<int>>, vector<Support<W>>>> partition_indices_n_exp(n_filters.size());
+    {
+        GILRelease const no_gil{};
+        NumThreadsGuard const threads{num_threads};
+
+        vector<vector<Support<W>>> n_supports{};
+        vector<vector<Support<W>>> n_unique_supports(n_filters.size());
+        vector<vector<int>> n_weights(n_filters.size());
+        {
+            PhaseTimer const timer{stats, "dedup"};
+            n_supports = filters2supports(n_filters);
+            #pragma omp parallel for schedule(dynamic)
+            for (auto i = 0; i < int(n_supports.size()); ++i) {
+                tie(n_unique_supports[i], n_weights[i]) = select_unique_n_weight(n_supports[i]);
+            }
+        }
+
+        vector<vector<Support<W>>> n_exp_unique_supports{};
+        vector<support_map<W, Support<W>>> expansions{};
+        tie(n_exp_unique_supports, expansions) = 
+            find_min_chain_partition_w_expansion(n_unique_supports, n_weights, max_memory, stats);
 
-    // this is to damn unreadable....
-    vector<pair<vector<vector<int>>, vector<Support>>> partition_indices_n_exp;
-    for (auto i = 0u; i < n_supports.size(); i++) {
-        vector<Support> exp_supports{};
-        for (auto const& s : n_supports[i]) {
-            exp_supports.emplace_back(expansions[i][s]);
+        for (auto i = 0u; i < n_supports.size(); ++i) {
+            log()->info("for set# {:d}, old size is {:d} and new size is {:d}", i, n_unique_supports[i].size(), n_exp_unique_supports[i].size());
+        }
+
+        #pragma omp parallel for schedule(dynamic)
+        for (auto i = 0; i < int(n_supports.size()); i++) {
+            partitions[i] = find_min_chain_partition(n_exp_unique_supports[i], stats);
+
+            PhaseTimer const timer{stats, "index_mapping"};
+            vector<Support<W>> exp_supports{};
+            for (auto const& s : n_supports[i]) {
+                exp_supports.emplace_back(expansions[i][s]);
+            }
+            auto const partition_indices = map_partition_indices(partitions[i], exp_supports);
+            partition_indices_n_exp[i] = make_pair(partition_indices, exp_supports);
         }
-        auto const partition_indices = map_partition_indices(partitions[i], exp_supports);
-        partition_indices_n_exp.emplace_back(partition_indices, exp_supports);
     }
 
+    PhaseTimer const timer{stats, "conversion"};
     return py::make_tuple(to_python(partitions), to_python(partition_indices_n_exp));
 }
+
+template<size_t W>
+class ChainPartitionOfWidth : public AnyChainPartition {
+public:
+    explicit ChainPartitionOfWidth(vector<Support<W>> const& supports)
+        : partition_{supports} {
+    }
+
+    auto add(py::object entry) -> py::object override {
+        return delta2python(partition_.add(to_support(Filter<W>(entry))));
+    }
+
+    auto remove(py::object entry) -> py::object override {
+        return delta2python(partition_.remove(to_support(Filter<W>(entry))));
+    }
+
+    auto group_of(py::object entry) const -> int override {
+        return partition_.group_of(to_support(Filter<W>(entry)));
+    }
+
+    auto groups() const -> py::object override {
+        return to_python(partition_.groups());
+    }
+
+private:
+    ChainPartition<W> partition_;
+};
+
+} // namespace 
+
+auto p4t::min_pmgr(py::object svmr, int num_threads, py::object stats) -> py::object {
+    if (svmr_size(svmr) == 0) {
+        return py::object();
+    }
+    return dispatch_width(svmr_width(svmr), [&](auto width) {
+        return min_pmgr_impl<decltype(width)::value>(svmr, num_threads, to_stats(stats));
+    });
+}
+
+auto p4t::min_bmgr(py::object svmrs, int max_num_groups, int num_threads, py::object stats) -> py::object {
+    return dispatch_width(svmrs_width(svmrs), [&](auto width) {
+        return min_bmgr_impl<decltype(width)::value>(svmrs, max_num_groups, num_threads, to_stats(stats));
+    });
+}
+
+auto p4t::best_subgroup(py::object svmr, int l, bool only_exact, string algo, int num_threads, py::object stats) -> py::object {
+    return dispatch_width(svmr_width(svmr), [&](auto width) {
+        return best_subgroup_impl<decltype(width)::value>(svmr, l, only_exact, algo, num_threads, to_stats(stats));
+    });
+}
+
+auto p4t::best_subgroups(
+        py::object svmr, int l, string algo, bool only_exact, int max_num_groups, 
+        py::object progress, int num_threads, py::object stats) -> py::object {
+    return dispatch_width(svmr_width(svmr), [&](auto width) {
+        return best_subgroups_impl<decltype(width)::value>(
+            svmr, l, algo, only_exact, max_num_groups, progress, num_threads, to_stats(stats)
+        );
+    });
+}
+
+void p4t::set_num_threads(int num_threads) {
+    omp_set_dynamic(false);
+    omp_set_num_threads(num_threads);
+}
+
+
+auto p4t::min_pmgr_w_expansions(py::object svmrs, int max_memory, int num_threads, py::object stats) -> py::object {
+    if (len(svmrs) == 0) {
+        return py::object();
+    }
+    return dispatch_width(svmrs_width(svmrs), [&](auto width) {
+        return min_pmgr_w_expansions_impl<decltype(width)::value>(svmrs, max_memory, num_threads, to_stats(stats));
+    });
+}
+
+auto p4t::make_chain_partition(py::object svmr) -> boost::shared_ptr<AnyChainPartition> {
+    return dispatch_width(svmr_width(svmr), [&](auto width) -> boost::shared_ptr<AnyChainPartition> {
+        auto constexpr W = decltype(width)::value;
+        if (svmr_size(svmr) == 0) {
+            return boost::make_shared<ChainPartitionOfWidth<W>>(vector<Support<W>>{});
+        }
+        return boost::make_shared<ChainPartitionOfWidth<W>>(to_supports(svmr2filters<W>(svmr)));
+    });
+}
+
+auto p4t::stats_timings(Stats const& stats) -> py::object {
+    return to_python(stats.timings());
+}
+
+auto p4t::stats_counters(Stats const& stats) -> py::object {
+    return to_python(stats.counters());
+}
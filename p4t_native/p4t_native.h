@@ -5,12 +5,36 @@
 
 namespace p4t {
 
-auto min_pmgr(py::object classifier) -> py::object;
-auto min_pmgr_w_expansions(py::object classifiers, int max_memory) -> py::object;
-auto min_bmgr(py::object classifiers, int max_num_groups) -> py::object;
-auto best_subgroup(py::object classifier, int max_width, bool only_exact, string algo) -> py::object;
+// num_threads overrides the number of OpenMP threads for a single call, zero keeps the global setting;
+// if stats is a Stats object, phase timings and counters of the call are added to it
+auto min_pmgr(py::object classifier, int num_threads, py::object stats) -> py::object;
+auto min_pmgr_w_expansions(py::object classifiers, int max_memory, int num_threads, py::object stats) -> py::object;
+auto min_bmgr(py::object classifiers, int max_num_groups, int num_threads, py::object stats) -> py::object;
+auto best_subgroup(py::object classifier, int max_width, bool only_exact, string algo, int num_threads, py::object stats) -> py::object;
+// Iterates best_subgroup over the remaining entries until there are none or max_num_groups (unless negative) groups,
+// if progress is not None, it is called with the number of groups and the number of remaining entries after each one
+auto best_subgroups(
+        py::object classifier, int max_width, string algo, bool only_exact, int max_num_groups, 
+        py::object progress, int num_threads, py::object stats) -> py::object;
 void set_num_threads(int num_threads);
 
+class Stats;
+auto stats_timings(Stats const& stats) -> py::object;
+auto stats_counters(Stats const& stats) -> py::object;
+
+// ChainPartition of the narrowest width that holds the keys of the classifier it is made from
+class AnyChainPartition {
+public:
+    virtual ~AnyChainPartition() = default;
+
+    virtual auto add(py::object entry) -> py::object = 0;
+    virtual auto remove(py::object entry) -> py::object = 0;
+    virtual auto group_of(py::object entry) const -> int = 0;
+    virtual auto groups() const -> py::object = 0;
+};
+
+auto make_chain_partition(py::object classifier) -> boost::shared_ptr<AnyChainPartition>;
+
 }
 
 #endif
@@ -1,13 +1,33 @@
 #include <boost/python.hpp>
 
 #include "p4t_native.h"
+#include "stats.h"
 
 BOOST_PYTHON_MODULE(p4t_native) {
     using namespace boost::python;
 
-    def("min_pmgr", p4t::min_pmgr);
-    def("best_subgroup", p4t::best_subgroup);
+    def("min_pmgr", p4t::min_pmgr, (arg("classifier"), arg("num_threads") = 0, arg("stats") = object()));
+    def("best_subgroup", p4t::best_subgroup, 
+        (arg("classifier"), arg("max_width"), arg("only_exact"), arg("algo"), arg("num_threads") = 0, arg("stats") = object()));
+    def("best_subgroups", p4t::best_subgroups, 
+        (arg("classifier"), arg("max_width"), arg("algo"), arg("only_exact") = false, arg("max_num_groups") = -1, 
+         arg("progress") = object(), arg("num_threads") = 0, arg("stats") = object()));
     def("set_num_threads", p4t::set_num_threads);
-    def("min_bmgr", p4t::min_bmgr);
-    def("min_pmgr_w_expansions", p4t::min_pmgr_w_expansions);
+    def("set_log_level", p4t::set_log_level);
+    def("set_log_sink", p4t::set_log_sink);
+    def("min_bmgr", p4t::min_bmgr, 
+        (arg("classifiers"), arg("max_num_groups"), arg("num_threads") = 0, arg("stats") = object()));
+    def("min_pmgr_w_expansions", p4t::min_pmgr_w_expansions, 
+        (arg("classifiers"), arg("max_memory"), arg("num_threads") = 0, arg("stats") = object()));
+
+    class_<p4t::Stats, boost::noncopyable>("Stats")
+        .add_property("timings", p4t::stats_timings)
+        .add_property("counters", p4t::stats_counters);
+
+    class_<p4t::AnyChainPartition, boost::shared_ptr<p4t::AnyChainPartition>, boost::noncopyable>("ChainPartition", no_init)
+        .def("__init__", make_constructor(p4t::make_chain_partition))
+        .def("add", &p4t::AnyChainPartition::add)
+        .def("remove", &p4t::AnyChainPartition::remove)
+        .def("group_of", &p4t::AnyChainPartition::group_of)
+        .def("groups", &p4t::AnyChainPartition::groups);
 }
@@ -0,0 +1,72 @@
+#ifndef STATS_H
+#define STATS_H
+
+#include <chrono>
+#include <map>
+#include <mutex>
+
+#include "common.h"
+
+namespace p4t {
+
+// Wall time of the phases of a single call in seconds and its counters. Phases that run
+// in parallel loops are summed over the threads. Safe to fill from several threads.
+class Stats {
+public:
+    void add_time(string const& phase, double seconds) {
+        std::lock_guard<std::mutex> lock{mutex_};
+        timings_[phase] += seconds;
+    }
+
+    void add(string const& counter, long long value) {
+        std::lock_guard<std::mutex> lock{mutex_};
+        counters_[counter] += value;
+    }
+
+    auto timings() const {
+        std::lock_guard<std::mutex> lock{mutex_};
+        return timings_;
+    }
+
+    auto counters() const {
+        std::lock_guard<std::mutex> lock{mutex_};
+        return counters_;
+    }
+
+private:
+    mutable std::mutex mutex_;
+    std::map<string, double> timings_;
+    std::map<string, long long> counters_;
+};
+
+// Adds the time spent in its scope to a phase, stats may be null
+class PhaseTimer {
+public:
+    PhaseTimer(Stats* stats, string phase)
+        : stats_{stats}, phase_{std::move(phase)}, start_{std::chrono::steady_clock::now()} {
+    }
+
+    PhaseTimer(PhaseTimer const&) = delete;
+    PhaseTimer& operator=(PhaseTimer const&) = delete;
+
+    ~PhaseTimer() {
+        if (stats_ != nullptr) {
+            stats_->add_time(phase_, std::chrono::duration<double>(std::chrono::steady_clock::now() - start_).count());
+        }
+    }
+
+private:
+    Stats* const stats_;
+    string const phase_;
+    std::chrono::steady_clock::time_point const start_;
+};
+
+inline void count(Stats* stats, string const& counter, long long value) {
+    if (stats != nullptr) {
+        stats->add(counter, value);
+    }
+}
+
+}
+
+#endif
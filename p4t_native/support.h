@@ -8,12 +8,67 @@
 #include "filter.h"
 
 namespace p4t { 
-using Support = vector<int>;
 
-template<class T>
-using support_map = std::unordered_map<Support, T, boost::hash<Support>>;
+// The set of exact bits of a filter packed into a bitmask
+template<size_t W>
+class Support {
+public:
+    Support() = default;
 
-inline auto select_unique(vector<Support> supports) -> vector<Support> {
+    explicit Support(bitarray<W> const& bits) 
+        : bits_(bits) {
+    }
+
+    auto const& bits() const {
+        return bits_;
+    }
+
+    auto size() const {
+        return bits_.count();
+    }
+
+    auto indices() const -> vector<int> {
+        vector<int> result{};
+        for (auto i = bits_._Find_first(); i < bits_.size(); i = bits_._Find_next(i)) {
+            result.emplace_back(i);
+        }
+        return result;
+    }
+
+    friend auto operator==(Support const& lhs, Support const& rhs) {
+        return lhs.bits_ == rhs.bits_;
+    }
+
+    friend auto operator!=(Support const& lhs, Support const& rhs) {
+        return lhs.bits_ != rhs.bits_;
+    }
+
+    // Lexicographical order of sorted index lists, i.e., the order of vector<int> supports
+    friend auto operator<(Support const& lhs, Support const& rhs) {
+        auto const diff = lhs.bits_ ^ rhs.bits_;
+        if (diff.none()) {
+            return false;
+        }
+        auto const first = diff._Find_first();
+        if (lhs.bits_[first]) {
+            return (rhs.bits_ >> (first + 1)).any();
+        }
+        return (lhs.bits_ >> (first + 1)).none();
+    }
+
+    friend auto hash_value(Support const& s) {
+        return std::hash<bitarray<W>>{}(s.bits_);
+    }
+
+private:
+    bitarray<W> bits_;
+};
+
+template<size_t W, class T>
+using support_map = std::unordered_map<Support<W>, T, boost::hash<Support<W>>>;
+
+template<size_t W>
+auto select_unique(vector<Support<W>> supports) -> vector<Support<W>> {
     std::sort(begin(supports), end(supports));
     auto last = std::unique(begin(supports), end(supports));
     supports.erase(last, end(supports));
@@ -21,39 +76,36 @@ inline auto select_unique(vector<Support> supports) -> vector<Support> {
     return supports;
 }
 
-inline auto to_support(Filter const& filter) -> Support {
-    Support result{};
-    for (auto i = 0; i < int(filter.size()); i++) {
-        if (filter[i] != Bit::ANY) {
-            result.emplace_back(i);
-        }
-    }
-    return result;
+template<size_t W>
+auto to_support(Filter<W> const& filter) -> Support<W> {
+    return Support<W>(filter.get_mask());
 }
 
-inline auto to_supports(vector<Filter> const& filters) -> vector<Support> {
-    vector<Support> supports{};
-    transform(begin(filters), end(filters), back_inserter(supports), to_support);
+template<size_t W>
+auto to_supports(vector<Filter<W>> const& filters) -> vector<Support<W>> {
+    vector<Support<W>> supports{};
+    transform(begin(filters), end(filters), back_inserter(supports), to_support<W>);
     return supports;
 }
 
-inline auto is_subset(Support const& rhs, Support const& lhs) {
-    return std::includes(begin(rhs), end(rhs), begin(lhs), end(lhs)); 
+template<size_t W>
+auto is_subset(Support<W> const& rhs, Support<W> const& lhs) {
+    return (lhs.bits() & ~rhs.bits()).none();
 }
 
-inline auto get_union(Support const& rhs, Support const& lhs) {
-    Support result{};
-    set_union(begin(rhs), end(rhs), begin(lhs), end(lhs), back_inserter(result));
-    return result;
+template<size_t W>
+auto get_union(Support<W> const& rhs, Support<W> const& lhs) {
+    return Support<W>(rhs.bits() | lhs.bits());
 }
 
-template<class OStream>
-OStream& operator<<(OStream& os, Support const& s) {
+template<class OStream, size_t W>
+OStream& operator<<(OStream& os, Support<W> const& s) {
+    auto const indices = s.indices();
     os << "{";
-    for (auto it = begin(s); next(it) != end(s); ++it) {
-        os << (*it) << ", ";
+    for (auto it = begin(indices); it != end(indices); ++it) {
+        os << (it != begin(indices) ? ", " : "") << (*it);
     }
-    os << s.back() << "}";
+    os << "}";
     return os;
 }
 
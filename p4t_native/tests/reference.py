@@ -0,0 +1,146 @@
+""" Random classifiers and brute-force counterparts of the p4t_native algorithms for tests. """
+
+from collections import namedtuple
+
+Entry = namedtuple('Entry', ['value', 'mask', 'action', 'priority'])
+
+# Key widths the tests are run with
+WIDTHS = [8, 24, 64, 100, 128, 129, 200, 320]
+
+
+def random_classifier(rng, num_entries, width, num_bits=10, num_supports=12):
+    """ Makes a classifier whose supports are drawn from a small pool of nested and random bit sets.
+
+    The exact bits come from num_bits positions of the key that always include its last bit,
+    so that the supports are often comparable and the words of wide keys are exercised.
+    """
+    positions = sorted(set(rng.sample(range(width - 1), min(width - 1, num_bits - 1)) + [width - 1]))
+    pool = []
+    while len(pool) < num_supports:
+        if pool and rng.random() < 0.6:
+            support = set(rng.choice(pool))
+            bit = rng.choice(positions)
+            support.symmetric_difference_update([bit])
+        else:
+            support = set(x for x in positions if rng.random() < 0.5)
+        pool.append(frozenset(support))
+    return [random_entry(rng, width, rng.choice(pool)) for _ in range(num_entries)]
+
+
+def random_entry(rng, width, support):
+    return Entry(
+        tuple(i in support and rng.random() < 0.5 for i in range(width)),
+        tuple(i in support for i in range(width)),
+        0, 0
+    )
+
+
+def get_support(entry):
+    return frozenset(i for i, x in enumerate(entry.mask) if x)
+
+
+def is_chain(supports):
+    """ Returns whether the supports are distinct and nested. """
+    supports = sorted(supports, key=len)
+    return all(lhs < rhs for lhs, rhs in zip(supports, supports[1:]))
+
+
+def min_num_chains(supports):
+    """ The size of a minimum chain partition, found by Kuhn's matching on the Dilworth graph. """
+    supports = list(set(supports))
+    mate = {}
+
+    def augment(u, visited):
+        for v in range(len(supports)):
+            if supports[u] < supports[v] and v not in visited:
+                visited.add(v)
+                if v not in mate or augment(mate[v], visited):
+                    mate[v] = u
+                    return True
+        return False
+
+    return len(supports) - sum(1 for u in range(len(supports)) if augment(u, set()))
+
+
+
+def max_weight_of_chains(weights, max_num_chains):
+    """ The maximal total weight of supports that at most max_num_chains chains can cover.
+
+    Args:
+        weights: A list of dicts, one per classifier, from a support to its weight.
+        max_num_chains: The bound on the total number of chains.
+    """
+    best = [0] * (max_num_chains + 1)
+    for support_weights in weights:
+        supports = list(support_weights)
+        best_for_set = [0] * (max_num_chains + 1)
+        for subset in range(1 << len(supports)):
+            selected = [s for i, s in enumerate(supports) if subset >> i & 1]
+            num_chains = min_num_chains(selected)
+            if num_chains <= max_num_chains:
+                weight = sum(support_weights[s] for s in selected)
+                best_for_set[num_chains] = max(best_for_set[num_chains], weight)
+        best = [
+            max(best[k - j] + max(best_for_set[:j + 1]) for j in range(k + 1))
+            for k in range(max_num_chains + 1)
+        ]
+    return best[max_num_chains]
+
+
+def to_ints(entry):
+    """ Returns the value and the mask of an entry as integers, bit i of the key is bit i of them. """
+    value = sum(1 << i for i, (v, m) in enumerate(zip(entry.value, entry.mask)) if v and m)
+    mask = sum(1 << i for i, m in enumerate(entry.mask) if m)
+    return value, mask
+
+
+def find_maximal_oi_subset(filters, bits):
+    """ Greedily selects filters that do not intersect the selected ones on the given bits.
+
+    Args:
+        filters: Sequence of value and mask pairs as returned by to_ints.
+        bits: Bits as an integer mask.
+    """
+    selected = []
+    for i, (value, mask) in enumerate(filters):
+        if all((value ^ other_value) & mask & other_mask & bits for other_value, other_mask in
+               (filters[j] for j in selected)):
+            selected.append(i)
+    return selected
+
+
+def best_to_stay_oi(classifier, l, only_exact):
+    """ Bits and entries of the subgroup that best_subgroup selects with the icnp_oi algorithm.
+
+    While there are more than l bits (or some of them are not exact, if only_exact is set), the bit
+    is dropped whose removal keeps the most filters in the greedy order-independent selection,
+    and only the filters of the selection made before the removal are kept.
+    """
+    filters = [to_ints(entry) for entry in classifier]
+    indices = list(range(len(classifier)))
+    bits = list(range(len(classifier[0].mask)))
+
+    def exact_bits():
+        return [b for b in bits if all(mask >> b & 1 for _, mask in filters)]
+
+    def bit_mask(bits):
+        return sum(1 << b for b in bits)
+
+    while len(bits) > l or (only_exact and bits != exact_bits()):
+        bits_to_avoid = exact_bits() if only_exact else []
+        candidates = [b for b in bits if b not in bits_to_avoid] or bits_to_avoid
+        selected = find_maximal_oi_subset(filters, bit_mask(bits))
+
+        # A bit that is not exact in any filter does not take part in intersections
+        used = 0
+        for _, mask in filters:
+            used |= mask
+
+        best_bit = max(candidates, key=lambda bit: len(
+            find_maximal_oi_subset(filters, bit_mask(b for b in bits if b != bit)) if used >> bit & 1 else selected
+        ))
+        bits.remove(best_bit)
+        indices = [indices[i] for i in selected]
+        filters = [filters[i] for i in selected]
+
+    return bits, indices
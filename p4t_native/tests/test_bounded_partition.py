@@ -0,0 +1,43 @@
+""" Bounded chain partitions of min_bmgr against exhaustive search on small random classifiers. """
+
+import random
+import unittest
+from collections import Counter
+
+import p4t_native
+
+from reference import WIDTHS, get_support, is_chain, max_weight_of_chains, random_classifier
+
+
+class MinBmgrTest(unittest.TestCase):
+    def test_random(self):
+        rng = random.Random(7)
+        for width in WIDTHS:
+            for _ in range(10):
+                classifiers = [
+                    random_classifier(rng, rng.randint(1, 20), width, num_bits=5, num_supports=rng.randint(1, 7))
+                    for _ in range(rng.randint(1, 3))
+                ]
+                max_num_groups = rng.randint(0, 5)
+                partitions, n_partition_indices = p4t_native.min_bmgr(classifiers, max_num_groups)
+
+                self.assertLessEqual(sum(len(partition) for partition in partitions), max_num_groups)
+                num_covered = 0
+                for classifier, partition, partition_indices in zip(classifiers, partitions, n_partition_indices):
+                    chains = [[frozenset(s) for s in bitchain] for bitchain in partition]
+                    covered = [s for bitchain in chains for s in bitchain]
+                    self.assertEqual(len(covered), len(set(covered)))
+                    for bitchain, indices in zip(chains, partition_indices):
+                        self.assertTrue(is_chain(bitchain), bitchain)
+                        self.assertEqual(
+                            sorted(indices),
+                            [i for i, e in enumerate(classifier) if get_support(e) in bitchain]
+                        )
+                        num_covered += len(indices)
+
+                weights = [Counter(get_support(e) for e in classifier) for classifier in classifiers]
+                self.assertEqual(num_covered, max_weight_of_chains(weights, max_num_groups))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+""" Minimum chain partitions of min_pmgr and ChainPartition against Kuhn's matching on random classifiers. """
+
+import random
+import unittest
+from math import factorial
+
+import p4t_native
+
+from reference import WIDTHS, get_support, is_chain, min_num_chains, random_classifier, random_entry
+
+
+def binomial(n, k):
+    return factorial(n) // factorial(k) // factorial(n - k)
+
+
+class MinPmgrTest(unittest.TestCase):
+    def check_partition(self, classifier, partition, partition_indices):
+        """ Checks that the chains cover the supports of the classifier once and map to its entries. """
+        chains = [[frozenset(s) for s in bitchain] for bitchain in partition]
+        for bitchain in chains:
+            self.assertTrue(is_chain(bitchain), bitchain)
+
+        covered = [s for bitchain in chains for s in bitchain]
+        self.assertEqual(len(covered), len(set(covered)))
+        self.assertEqual(set(covered), set(get_support(e) for e in classifier))
+
+        self.assertEqual(sorted(i for indices in partition_indices for i in indices), list(range(len(classifier))))
+        for bitchain, indices in zip(chains, partition_indices):
+            for i in indices:
+                self.assertIn(get_support(classifier[i]), bitchain)
+
+    def test_random(self):
+        rng = random.Random(3)
+        for width in WIDTHS:
+            for _ in range(20):
+                classifier = random_classifier(rng, rng.randint(1, 60), width, num_supports=rng.randint(1, 30))
+                partition, partition_indices = p4t_native.min_pmgr(classifier)
+                self.check_partition(classifier, partition, partition_indices)
+                self.assertEqual(len(partition), min_num_chains(get_support(e) for e in classifier))
+
+    def test_prefixes(self):
+        rng = random.Random(4)
+        for width in WIDTHS:
+            classifier = [random_entry(rng, width, range(rng.randint(0, width))) for _ in range(50)]
+            partition, partition_indices = p4t_native.min_pmgr(classifier)
+            self.check_partition(classifier, partition, partition_indices)
+            self.assertEqual(len(partition), 1)
+
+    def test_greedy_cover_is_not_minimal(self):
+        # Appending {1, 2} to the chain of {1, 2, 3} leaves {1, 3} a chain of its own
+        rng = random.Random(4)
+        for width in WIDTHS:
+            supports = [[1, 2, 3], [1, 2, 4], [1, 2], [1, 3]]
+            for _ in range(10):
+                rng.shuffle(supports)
+                classifier = [random_entry(rng, width, [width - 5 + x for x in s]) for s in supports]
+                partition, partition_indices = p4t_native.min_pmgr(classifier)
+                self.check_partition(classifier, partition, partition_indices)
+                self.assertEqual(len(partition), 2)
+
+    def test_word_boundaries(self):
+        # All subsets of k bits need as many chains as the middle layer has subsets (Sperner)
+        rng = random.Random(6)
+        for width in WIDTHS:
+            bits = sorted(set(x for x in [0, 31, 32, 63, 64, width - 1] if x < width))
+            classifier = [
+                random_entry(rng, width, [x for i, x in enumerate(bits) if subset >> i & 1])
+                for subset in range(1 << len(bits))
+            ]
+            rng.shuffle(classifier)
+            partition, partition_indices = p4t_native.min_pmgr(classifier)
+            self.check_partition(classifier, partition, partition_indices)
+            self.assertEqual(len(partition), binomial(len(bits), len(bits) // 2))
+
+    def test_too_wide(self):
+        classifier = [random_entry(random.Random(16), 321, [0, 320])]
+        self.assertRaises(ValueError, p4t_native.min_pmgr, classifier)
+
+
+class ChainPartitionTest(unittest.TestCase):
+    def test_random_updates(self):
+        rng = random.Random(5)
+        for width in WIDTHS:
+            live = random_classifier(rng, rng.randint(0, 20), width)
+            partition = p4t_native.ChainPartition(live)
+            groups = dict(partition.groups())
+            for _ in range(100):
+                if live and rng.random() < 0.45:
+                    entry = live.pop(rng.randrange(len(live)))
+                    changed, removed, _ = partition.remove(entry)
+                else:
+                    entry = random_classifier(rng, 1, width)[0]
+                    live.append(entry)
+                    changed, removed, _ = partition.add(entry)
+
+                for group in removed:
+                    del groups[group]
+                groups.update(changed)
+                self.assertEqual(groups, dict(partition.groups()))
+
+                chains = dict((group, [frozenset(s) for s in bitchain]) for group, bitchain in groups.items())
+                for bitchain in chains.values():
+                    self.assertTrue(is_chain(bitchain), bitchain)
+                covered = [s for bitchain in chains.values() for s in bitchain]
+                self.assertEqual(len(covered), len(set(covered)))
+                self.assertEqual(set(covered), set(get_support(e) for e in live))
+                self.assertEqual(len(chains), min_num_chains(covered))
+                for entry in live:
+                    self.assertIn(get_support(entry), chains[partition.group_of(entry)])
+
+
+    def test_starts_empty(self):
+        # The key width is taken from the bitwidth of an empty classifier
+        rng = random.Random(16)
+        for width in WIDTHS:
+            partition = p4t_native.ChainPartition(EmptyClassifier(width))
+            entries = random_classifier(rng, 20, width)
+            for entry in entries:
+                partition.add(entry)
+            self.assertEqual(len(partition.groups()), min_num_chains(get_support(e) for e in entries))
+
+
+class EmptyClassifier(list):
+    def __init__(self, bitwidth):
+        super(EmptyClassifier, self).__init__()
+        self.bitwidth = bitwidth
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+""" Subgroups of best_subgroup with the icnp_oi algorithm against a plain greedy reimplementation. """
+
+import random
+import unittest
+
+import p4t_native
+
+from reference import WIDTHS, best_to_stay_oi, random_classifier
+
+
+class BestSubgroupTest(unittest.TestCase):
+    def test_icnp_oi(self):
+        rng = random.Random(12)
+        for width in WIDTHS:
+            for only_exact in [False, True]:
+                for _ in range(10):
+                    classifier = random_classifier(rng, rng.randint(1, 30), width, num_bits=min(width, 12))
+                    l = rng.randint(max(0, width - 6), width) if width > 24 else rng.randint(0, width)
+                    bits, indices = p4t_native.best_subgroup(classifier, l, only_exact, 'icnp_oi')
+                    self.assertEqual((list(bits), list(indices)), best_to_stay_oi(classifier, l, only_exact))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,22 +2,136 @@
 #define UTILS_H
 
 #include "filter.h"
+#include "support.h"
 
 namespace p4t {
 
+class BufferView {
+public:
+    explicit BufferView(py::object const& obj) {
+        if (PyObject_GetBuffer(obj.ptr(), &view_, PyBUF_SIMPLE) != 0) {
+            py::throw_error_already_set();
+        }
+    }
+
+    BufferView(BufferView const&) = delete;
+    BufferView& operator=(BufferView const&) = delete;
+
+    ~BufferView() {
+        PyBuffer_Release(&view_);
+    }
+
+    auto data() const {
+        return static_cast<uint8_t const*>(view_.buf);
+    }
+
+    auto size() const {
+        return size_t(view_.len);
+    }
+
+private:
+    Py_buffer view_;
+};
+
+// Releases the GIL for its lifetime, no Python objects may be touched meanwhile
+class GILRelease {
+public:
+    GILRelease() : state_{PyEval_SaveThread()} {}
+
+    GILRelease(GILRelease const&) = delete;
+    GILRelease& operator=(GILRelease const&) = delete;
+
+    ~GILRelease() {
+        PyEval_RestoreThread(state_);
+    }
 
-inline auto svmr2filters(py::object const& svmr) {
+private:
+    PyThreadState* state_;
+};
+
+// A classifier is packed if it looks like p4t.optimizations.lpm.PackedClassifier
+inline auto is_packed(py::object const& svmr) {
+    return PyObject_HasAttrString(svmr.ptr(), "num_entries") != 0;
+}
+
+inline auto svmr_size(py::object const& svmr) -> size_t {
+    if (is_packed(svmr)) {
+        return py::extract<size_t>(svmr.attr("num_entries"));
+    }
+    return len(svmr);
+}
+
+// Width of the keys of a classifier, the width of its first entry unless it is packed,
+// an empty classifier has the width of its bitwidth attribute (if any) as in lpm.pack
+inline auto svmr_width(py::object const& svmr) -> size_t {
+    if (is_packed(svmr)) {
+        return py::extract<size_t>(svmr.attr("width"));
+    }
     if (len(svmr) == 0) {
+        return py::extract<size_t>(py::getattr(svmr, "bitwidth", py::object(0)));
+    }
+    return len(svmr[0].attr("value"));
+}
+
+// The narrowest width to hold keys of all classifiers
+inline auto svmrs_width(py::object const& svmrs) -> size_t {
+    auto result = size_t{0};
+    for (auto i = 0; i < len(svmrs); ++i) {
+        result = std::max(result, svmr_width(svmrs[i]));
+    }
+    return result;
+}
+
+template<size_t W>
+auto packed2filters(py::object const& svmr) {
+    size_t const num_entries = py::extract<size_t>(svmr.attr("num_entries"));
+    size_t const width = py::extract<size_t>(svmr.attr("width"));
+
+    BufferView const value{svmr.attr("value")};
+    BufferView const mask{svmr.attr("mask")};
+
+    if (value.size() != mask.size() || value.size() % num_entries != 0) {
+        throw std::invalid_argument("value and mask buffers should hold num_entries rows of the same size");
+    }
+    auto const row_size = value.size() / num_entries;
+    if (width > W || 8 * row_size < width) {
+        throw std::invalid_argument("unsupported width or rows are too short");
+    }
+
+    vector<Filter<W>> filters{};
+    filters.reserve(num_entries);
+    for (auto i = 0u; i < num_entries; i++) {
+        filters.emplace_back(value.data() + i * row_size, mask.data() + i * row_size, width);
+    }
+
+    return filters;
+}
+
+template<size_t W>
+auto svmr2filters(py::object const& svmr) {
+    if (svmr_size(svmr) == 0) {
         throw std::invalid_argument("svmr should not be empty");
     }
-    vector<Filter> filters{};
+    if (is_packed(svmr)) {
+        return packed2filters<W>(svmr);
+    }
+    vector<Filter<W>> filters{};
     for (auto i = 0; i < len(svmr); i++) {
-        filters.emplace_back(Filter(svmr[i]));
+        filters.emplace_back(Filter<W>(svmr[i]));
     }
 
     return filters;
 }
 
+template<size_t W>
+auto to_python(Support<W> const& s) -> py::list {
+    py::list result{};
+    for (auto i : s.indices()) {
+        result.append(i);
+    }
+    return result;
+}
+
 }
 
 namespace std { // Need std for ADL
@@ -41,6 +155,20 @@ auto to_python(vector<T> const& xs) -> boost::python::list {
     return result;
 }
 
+template<class T1, class T2, class T3>
+auto to_python(tuple<T1, T2, T3> const& t) -> boost::python::tuple {
+    return boost::python::make_tuple(to_python(get<0>(t)), to_python(get<1>(t)), to_python(get<2>(t)));
+}
+
+template<class K, class V>
+auto to_python(map<K, V> const& xs) -> boost::python::dict {
+    boost::python::dict result{};
+    for (auto const& x : xs) {
+        result[to_python(x.first)] = to_python(x.second);
+    }
+    return result;
+}
+
 template<class T>
 auto to_python(set<T> const& xs) -> boost::python::list {
     boost::python::list result{};